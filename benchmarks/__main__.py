@@ -0,0 +1,233 @@
+''' Minimal standalone runner for the asv benchmarks in this directory.
+
+    python -m benchmarks [--filter REGEX] [--save FILE] [--compare FILE]
+
+The benchmarks are ordinary asv benchmarks and can also be run with
+"asv run" using asv.conf.json in the repository root. This runner covers the
+subset of asv used here: time_, peakmem_, track_ and timeraw_ functions or
+methods, params/param_names and setup/setup_cache. Wall times are the best
+of a few repeats; peak memory is the peak traced numpy/Python allocation
+measured with tracemalloc. Results are assumed lower-is-better unless the
+benchmark has the attribute higher_is_better = True (e.g. a tracked recall),
+which --compare takes into account.
+'''
+import argparse
+import importlib
+import inspect
+import itertools
+import json
+import os
+import pkgutil
+import re
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+
+PREFIXES = ('time_', 'peakmem_', 'track_', 'timeraw_')
+
+
+def _discover():
+    ''' Yield (name, fun, owner) for all benchmarks. owner is the class of a
+    benchmark method or None for module level functions. '''
+    pkg_dir = os.path.dirname(os.path.abspath(__file__))
+    for _, mod_name, _ in pkgutil.iter_modules([pkg_dir]):
+        if not mod_name.startswith('bench_'):
+            continue
+        module = importlib.import_module('benchmarks.' + mod_name)
+        for attr, obj in sorted(vars(module).items()):
+            if inspect.isclass(obj) and obj.__module__ == module.__name__:
+                for meth in sorted(dir(obj)):
+                    if meth.startswith(PREFIXES):
+                        name = '%s.%s.%s' % (mod_name, attr, meth)
+                        yield name, meth, obj
+            elif inspect.isfunction(obj) and attr.startswith(PREFIXES):
+                yield '%s.%s' % (mod_name, attr), obj, None
+
+
+def _param_grid(owner):
+    params = getattr(owner, 'params', [])
+    if not params:
+        return [()]
+    if not isinstance(params, tuple):
+        params = (params,)
+    return list(itertools.product(*params))
+
+
+def _best_time(fun, repeat, min_time=0.1):
+    ''' Best time per call over repeat runs, each at least min_time long. '''
+    number = 1
+    while True:
+        t = timeit.timeit(fun, number=number)
+        if t >= min_time or number >= 1000:
+            break
+        number *= 10
+    times = [t] + timeit.repeat(fun, number=number, repeat=repeat-1)
+    return min(times)/number
+
+
+def _peakmem(fun):
+    tracemalloc.start()
+    try:
+        fun()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _timeraw(code, repeat):
+    times = []
+    for _ in range(repeat):
+        stmt = 'import time; t = time.time(); %s; print(time.time() - t)'
+        out = subprocess.check_output([sys.executable, '-c', stmt % code])
+        times.append(float(out))
+    return min(times)
+
+
+def _measure(kind, fun, repeat):
+    if kind == 'time':
+        return _best_time(fun, repeat)
+    if kind == 'peakmem':
+        return _peakmem(fun)
+    if kind == 'timeraw':
+        return _timeraw(fun(), repeat)
+    return fun()
+
+
+def _failed(key, e):
+    print('%-60s %10s  %s: %s' % (key, 'failed', type(e).__name__, e))
+    sys.stdout.flush()
+
+
+def run(pattern=None, repeat=3, higher_is_better=None):
+    ''' Run benchmarks whose names, including their parameters, match the
+    regular expression pattern and return a dict mapping "name(params)" to
+    results. As with asv, a benchmark whose setup or measurement raises an
+    exception is reported and recorded with the result None. If
+    higher_is_better is a set, the names of the benchmarks whose results
+    are higher-is-better are added to it. '''
+    results = {}
+    cache = {}
+    for name, fun, owner in _discover():
+        kind = name.rsplit('.', 1)[1].split('_', 1)[0]
+        bench_fun = fun if owner is None else getattr(owner, fun)
+        higher = getattr(bench_fun, 'higher_is_better', False)
+        if owner is None:
+            if pattern is not None and not re.search(pattern, name):
+                continue
+            if higher and higher_is_better is not None:
+                higher_is_better.add(name)
+            try:
+                results[name] = _measure(kind, fun, repeat)
+            except Exception as e:
+                results[name] = None
+                _failed(name, e)
+                continue
+            print('%-60s %s' % (name, _format(kind, results[name])))
+            continue
+        for params in _param_grid(owner):
+            key = '%s(%s)' % (name, ', '.join(repr(p) for p in params))
+            if pattern is not None and not re.search(pattern, key):
+                continue
+            if higher and higher_is_better is not None:
+                higher_is_better.add(key)
+            try:
+                if hasattr(owner, 'setup_cache') and owner not in cache:
+                    try:
+                        cache[owner] = owner().setup_cache()
+                    except Exception as e:
+                        cache[owner] = e
+                if isinstance(cache.get(owner), Exception):
+                    raise cache[owner]
+                args = ((cache[owner],) if owner in cache else ()) + params
+                bench = owner()
+                if hasattr(bench, 'setup'):
+                    try:
+                        bench.setup(*args)
+                    except NotImplementedError:
+                        continue
+                method = getattr(bench, fun)
+                try:
+                    results[key] = _measure(kind, lambda: method(*args),
+                                            repeat)
+                finally:
+                    if hasattr(bench, 'teardown'):
+                        bench.teardown(*args)
+            except Exception as e:
+                results[key] = None
+                _failed(key, e)
+                continue
+            print('%-60s %s' % (key, _format(kind, results[key])))
+            sys.stdout.flush()
+    return results
+
+
+def _format(kind, value):
+    if kind in ('time', 'timeraw'):
+        return '%10.3f ms' % (value*1e3)
+    if kind == 'peakmem':
+        return '%10.1f MB' % (value/2.0**20)
+    return '%10s' % value
+
+
+def compare(results, baseline, threshold, higher_is_better=()):
+    ''' Print benchmarks that changed by more than a factor threshold
+    relative to baseline and return the names of the regressions. Results
+    of the benchmarks in higher_is_better regress when they decrease. '''
+    regressions = []
+    for key in sorted(set(results) & set(baseline)):
+        new, old = results[key], baseline[key]
+        # Failed benchmarks are recorded as None
+        if new is None or not isinstance(old, (int, float)):
+            continue
+        if old == 0:
+            # No ratio for zero baselines, e.g. the number of heavy modules
+            # loaded on import. Any change in the wrong direction regresses.
+            if (new < old) if key in higher_is_better else (new > old):
+                regressions.append(key)
+                print('REGRESSION %-50s %7s -> %s' % (key, old, new))
+            elif new != old:
+                print('improved   %-50s %7s -> %s' % (key, old, new))
+            continue
+        ratio = new / float(old)
+        # Factor by which the result got worse
+        if key in higher_is_better:
+            worse = old / float(new) if new else float('inf')
+        else:
+            worse = ratio
+        if worse > threshold:
+            regressions.append(key)
+            print('REGRESSION %-50s %6.2fx' % (key, ratio))
+        elif worse < 1.0/threshold:
+            print('improved   %-50s %6.2fx' % (key, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('--filter', default=None,
+                        help='regular expression selecting benchmarks')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', default=None,
+                        help='write results to this JSON file')
+    parser.add_argument('--compare', default=None,
+                        help='compare against results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='ratio above which a change is a regression')
+    args = parser.parse_args()
+
+    higher_is_better = set()
+    results = run(args.filter, args.repeat, higher_is_better)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold, higher_is_better):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import os
+import numpy as np
+
+from ipcv import JetDescriptor
+from ipcv.util import imread, read_keypoints
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                        'examples', 'data')
+
+
+def load_image(name):
+    ''' Load a grayscale image from examples/data with intensities in
+    [0, 1]. '''
+    return imread(os.path.join(DATA_DIR, name), flatten=True)/255.
+
+
+def load_keypoints(name):
+    return read_keypoints(os.path.join(DATA_DIR, name))
+
+
+def image_of_size(size, name='camera.png'):
+    ''' Return a (size, size) image by mirror-tiling an example image. '''
+    img = load_image(name)
+    reps = int(np.ceil(size / float(min(img.shape))))
+    img = np.concatenate([img, img[::-1]], axis=0)
+    img = np.concatenate([img, img[:, ::-1]], axis=1)
+    img = np.tile(img, (reps, reps))
+    return np.ascontiguousarray(img[:size, :size])
+
+
+def keypoints(n):
+    ''' Return n keypoints for dturobot01.png by repeating the bundled ones
+    with small offsets. '''
+    kps = load_keypoints('dturobot01.kp')
+    reps = int(np.ceil(n / float(len(kps))))
+    offsets = np.repeat(np.arange(reps) % 3, len(kps))
+    kps = np.tile(kps, (reps, 1))
+    kps[:, :2] += offsets[:, np.newaxis]
+    return kps[:n]
+
+
+def jet_descriptors(step=4):
+    ''' Return (database, queries) jet descriptors from the example images.
+    The database consists of dense descriptors, the queries of descriptors
+    at the keypoints of dturobot01. '''
+    jd = JetDescriptor()
+    database = [jd.compute_dense(load_image(name), step, radius=4.0)[1]
+                for name in ['camera.png', 'dturobot01.png']]
+    database = np.concatenate(database)
+    queries = jd.compute(load_image('dturobot01.png'),
+                         load_keypoints('dturobot01.kp'))
+    return database, queries
@@ -0,0 +1,43 @@
+import numpy as np
+
+from ipcv.ann import IVFPQIndex
+from ipcv.matching import nearest_neighbors
+
+from ._data import jet_descriptors
+
+
+class IVFPQSearch:
+    ''' Approximate search with IVFPQIndex against exact search on jet
+    descriptors of the example images. '''
+    params = [1, 4, 16, 64]
+    param_names = ['nprobe']
+    timeout = 300
+
+    def setup_cache(self):
+        database, queries = jet_descriptors()
+        index = IVFPQIndex(n_lists=256, n_subspaces=10).build(database,
+                                                              seed=0)
+        _, true_ids = nearest_neighbors(queries, database, k=1)
+        return index, database, queries, true_ids[:, 0]
+
+    def time_search(self, cache, nprobe):
+        index, _, queries, _ = cache
+        index.search(queries, k=10, nprobe=nprobe)
+
+    def time_exact_search(self, cache, nprobe):
+        _, database, queries, _ = cache
+        nearest_neighbors(queries, database, k=10)
+
+    def track_recall_at_1(self, cache, nprobe):
+        index, _, queries, true_ids = cache
+        _, ids = index.search(queries, k=1, nprobe=nprobe)
+        return np.mean(ids[:, 0] == true_ids)
+
+    track_recall_at_1.higher_is_better = True
+
+    def track_recall_at_10(self, cache, nprobe):
+        index, _, queries, true_ids = cache
+        _, ids = index.search(queries, k=10, nprobe=nprobe)
+        return np.mean(np.any(ids == true_ids[:, np.newaxis], axis=1))
+
+    track_recall_at_10.higher_is_better = True
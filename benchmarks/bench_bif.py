@@ -0,0 +1,36 @@
+from ipcv import bif_hist, bif_response
+
+from ._data import image_of_size
+
+
+SIZES = [256, 1024, 4096]
+
+
+class BIFResponse:
+    params = (SIZES, [1.0, 4.0], [0.0, 0.02], [False, True])
+    param_names = ['size', 'scale', 'eps', 'fft']
+    timeout = 300
+
+    def setup(self, size, scale, eps, fft):
+        self.img = image_of_size(size)
+
+    def time_bif_response(self, size, scale, eps, fft):
+        bif_response(self.img, scale, eps, fft)
+
+    def peakmem_bif_response(self, size, scale, eps, fft):
+        bif_response(self.img, scale, eps, fft)
+
+
+class BIFHist:
+    params = (SIZES, [2, 4])
+    param_names = ['size', 'n_scales']
+    timeout = 300
+
+    def setup(self, size, n_scales):
+        self.img = image_of_size(size)
+
+    def time_bif_hist(self, size, n_scales):
+        bif_hist(self.img, n_scales=n_scales)
+
+    def peakmem_bif_hist(self, size, n_scales):
+        bif_hist(self.img, n_scales=n_scales)
@@ -0,0 +1,51 @@
+from ipcv import go_hist, si_hist, josi_hist
+from ipcv.misc import donuts
+
+from ._data import image_of_size
+
+
+SIZES = [256, 1024, 4096]
+SCALES = [[1, 2], [1, 2, 4, 8]]
+
+
+class Histograms:
+    params = (SIZES, SCALES, [4, 8, 16])
+    param_names = ['size', 'scales', 'n_bins']
+    timeout = 600
+
+    def setup(self, size, scales, n_bins):
+        self.img = image_of_size(size)
+
+    def time_go_hist(self, size, scales, n_bins):
+        go_hist(self.img, scales, n_bins)
+
+    def peakmem_go_hist(self, size, scales, n_bins):
+        go_hist(self.img, scales, n_bins)
+
+    def time_si_hist(self, size, scales, n_bins):
+        si_hist(self.img, scales, n_bins)
+
+    def peakmem_si_hist(self, size, scales, n_bins):
+        si_hist(self.img, scales, n_bins)
+
+    def time_josi_hist(self, size, scales, n_bins):
+        josi_hist(self.img, scales, n_bins, ori_n_bins=n_bins)
+
+    def peakmem_josi_hist(self, size, scales, n_bins):
+        josi_hist(self.img, scales, n_bins, ori_n_bins=n_bins)
+
+
+class WeightedHistograms:
+    params = ([256, 1024], [1, 4])
+    param_names = ['size', 'n_weights']
+    timeout = 300
+
+    def setup(self, size, n_weights):
+        self.img = image_of_size(size)
+        self.weights = donuts(self.img.shape, n_weights, size/4., size/16.)
+
+    def time_go_hist(self, size, n_weights):
+        go_hist(self.img, weights=self.weights)
+
+    def time_si_hist(self, size, n_weights):
+        si_hist(self.img, weights=self.weights)
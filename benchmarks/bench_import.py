@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+
+def timeraw_import_ipcv():
+    return 'import ipcv'
+
+
+def timeraw_import_ipcv_util():
+    return 'import ipcv.util'
+
+
+def track_heavy_modules_loaded():
+    ''' Number of heavy packages loaded by "import ipcv, ipcv.util". Should
+    stay 0; plotting and SciPy are imported on first use. '''
+    code = ('import sys, ipcv, ipcv.util; '
+            'print(sum(m in sys.modules for m in '
+            '["matplotlib", "scipy.ndimage", "scipy.misc"]))')
+    return int(subprocess.check_output([sys.executable, '-c', code]))
+
+
+track_heavy_modules_loaded.unit = 'modules'
@@ -0,0 +1,55 @@
+from ipcv import JetDescriptor
+from ipcv.detector import hessian_laplace
+
+from ._data import keypoints, load_image
+
+
+class JetDescriptorCompute:
+    params = ([100, 1382, 10000], [2, 4])
+    param_names = ['n_keypoints', 'k']
+    timeout = 600
+
+    def setup(self, n_keypoints, k):
+        self.img = load_image('dturobot01.png')
+        self.keypoints = keypoints(n_keypoints)
+        self.jd = JetDescriptor(k=k)
+
+    def time_init(self, n_keypoints, k):
+        JetDescriptor(k=k)
+
+    def time_compute(self, n_keypoints, k):
+        self.jd.compute(self.img, self.keypoints)
+
+    def peakmem_compute(self, n_keypoints, k):
+        self.jd.compute(self.img, self.keypoints)
+
+
+class JetDescriptorDense:
+    params = ([4, 16], [False, True])
+    param_names = ['step', 'fft']
+    timeout = 300
+
+    def setup(self, step, fft):
+        self.img = load_image('dturobot01.png')
+        self.jd = JetDescriptor()
+
+    def time_compute_dense(self, step, fft):
+        self.jd.compute_dense(self.img, step, radius=4.0, fft=fft)
+
+    def peakmem_compute_dense(self, step, fft):
+        self.jd.compute_dense(self.img, step, radius=4.0, fft=fft)
+
+
+class HessianLaplace:
+    params = ([False, True],)
+    param_names = ['affine']
+    timeout = 300
+
+    def setup(self, affine):
+        self.img = load_image('dturobot01.png')
+
+    def time_hessian_laplace(self, affine):
+        hessian_laplace(self.img, affine=affine)
+
+    def peakmem_hessian_laplace(self, affine):
+        hessian_laplace(self.img, affine=affine)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from ipcv.kernels import chi2_kernel, intersection_kernel
+
+
+def naive_chi2_kernel(X, Y):
+    x = X[:, np.newaxis, :]
+    y = Y[np.newaxis, :, :]
+    return 2*np.sum(x*y/(x+y+1e-12), axis=2)
+
+
+def naive_intersection_kernel(X, Y):
+    return np.sum(np.minimum(X[:, np.newaxis, :], Y[np.newaxis, :, :]),
+                  axis=2)
+
+
+class HistogramKernels:
+    ''' Blocked Gram matrices against naive broadcasting on random L1
+    normalized histograms. '''
+    params = ([250, 500], [32, 128])
+    param_names = ['n_hists', 'n_bins']
+    timeout = 300
+
+    def setup(self, n_hists, n_bins):
+        rng = np.random.RandomState(0)
+        X = rng.rand(n_hists, n_bins)
+        self.X = X / np.sum(X, axis=1)[:, np.newaxis]
+
+    def time_chi2_naive(self, n_hists, n_bins):
+        naive_chi2_kernel(self.X, self.X)
+
+    def time_chi2_blocked(self, n_hists, n_bins):
+        chi2_kernel(self.X)
+
+    def time_chi2_blocked_threaded(self, n_hists, n_bins):
+        chi2_kernel(self.X, n_threads=4)
+
+    def time_intersection_naive(self, n_hists, n_bins):
+        naive_intersection_kernel(self.X, self.X)
+
+    def time_intersection_blocked(self, n_hists, n_bins):
+        intersection_kernel(self.X)
+
+    def peakmem_chi2_naive(self, n_hists, n_bins):
+        naive_chi2_kernel(self.X, self.X)
+
+    def peakmem_chi2_blocked(self, n_hists, n_bins):
+        chi2_kernel(self.X)
@@ -0,0 +1,75 @@
+import numpy as np
+
+from ipcv import ScaleSpace, gradient_orientation, shape_index
+from ipcv.filtering import gaussian_filter
+
+from ._data import image_of_size
+
+
+SIZES = [256, 1024, 4096]
+
+
+class GradientOrientation:
+    params = (SIZES, [1.0, 4.0], [False, True])
+    param_names = ['size', 'scale', 'fft']
+    timeout = 300
+
+    def setup(self, size, scale, fft):
+        self.img = image_of_size(size)
+
+    def time_gradient_orientation(self, size, scale, fft):
+        gradient_orientation(self.img, scale, fft=fft)
+
+    def peakmem_gradient_orientation(self, size, scale, fft):
+        gradient_orientation(self.img, scale, fft=fft)
+
+
+class ShapeIndex:
+    params = (SIZES, [1.0, 4.0], [False, True], [False, True])
+    param_names = ['size', 'scale', 'fft', 'orientations']
+    timeout = 300
+
+    def setup(self, size, scale, fft, orientations):
+        self.img = image_of_size(size)
+
+    def time_shape_index(self, size, scale, fft, orientations):
+        shape_index(self.img, scale, orientations=orientations, fft=fft)
+
+    def peakmem_shape_index(self, size, scale, fft, orientations):
+        shape_index(self.img, scale, orientations=orientations, fft=fft)
+
+
+class ScaleSpaceCompute:
+    params = (SIZES, [1, 4])
+    param_names = ['size', 'n_sigmas']
+    timeout = 300
+
+    def setup(self, size, n_sigmas):
+        self.img = image_of_size(size)
+        sigmas = [2.0**i for i in range(n_sigmas)]
+        self.ss = ScaleSpace(self.img.shape, sigmas, [1]*n_sigmas,
+                             [1]*n_sigmas)
+
+    def time_init(self, size, n_sigmas):
+        ScaleSpace(self.img.shape, [1.0]*n_sigmas, [1]*n_sigmas,
+                   [1]*n_sigmas)
+
+    def time_compute(self, size, n_sigmas):
+        self.ss.compute(self.img)
+
+    def peakmem_compute(self, size, n_sigmas):
+        self.ss.compute(self.img)
+
+
+class GaussianFilter:
+    params = (SIZES, [1, 2, 4])
+    param_names = ['size', 'n_threads']
+    timeout = 300
+
+    def setup(self, size, n_threads):
+        self.img = image_of_size(size)
+        self.out = np.empty_like(self.img)
+
+    def time_gaussian_filter(self, size, n_threads):
+        gaussian_filter(self.img, 4.0, order=(1, 0), output=self.out,
+                        n_threads=n_threads)
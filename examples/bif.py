@@ -1,13 +1,12 @@
 #!/usr/bin/env python
 
-import scipy as sp
 from ipcv import bif_response, bif_colors
-from ipcv.util import imsave
+from ipcv.util import imread, imsave
 
 
 def visualize_bif():
     ''' Visualize the shape index responses. '''
-    img = sp.misc.imread('data/camera.png', flatten=True)
+    img = imread('data/camera.png', flatten=True)
     bif_img = bif_colors(bif_response(img, 2, eps=0.02))
     imsave('bif/lena-bif-sigma2.png', bif_img)
     bif_img = bif_colors(bif_response(img, 4, eps=0.02))
@@ -1,14 +1,13 @@
 #!/usr/bin/env python
 
 import numpy as np
-import scipy as sp
 from ipcv import gradient_orientation
-from ipcv.util import imsave
+from ipcv.util import imread, imsave
 
 
 def visualize_go():
     ''' Visualize the gradient orientation responses. '''
-    img = sp.misc.imread('data/patterns.png', flatten=True)
+    img = imread('data/patterns.png', flatten=True)
     go, go_m = gradient_orientation(img, 2.5, signed=True, fft=False)
     imsave('go/patterns-go.png', go)
     imsave('go/patterns-go_weighted.png', go*go_m)
@@ -19,7 +18,7 @@ def visualize_go():
 def visualize_go_fiducial_orientation():
     ''' Visualize the shape index orientation with a fiducial coordinate
         system.'''
-    img = sp.misc.imread('data/rings.png', flatten=True)
+    img = imread('data/rings.png', flatten=True)
     go, go_m = gradient_orientation(img, 2.5, signed=True, fft=False)
     # No fiducial coordinate system.
     imsave('go/rings-go.png', go)
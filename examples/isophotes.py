@@ -1,15 +1,14 @@
 #!/usr/bin/env python
 
 import numpy as np
-import scipy as sp
 from ipcv import gradient_orientation
 from ipcv.misc import isophotes
-from ipcv.util import imsave
+from ipcv.util import imread, imsave
 
 
 def visualize():
     ''' Visualize the shape index responses. '''
-    img = sp.misc.imread('data/patterns.png', flatten=True)
+    img = imread('data/patterns.png', flatten=True)
     go, go_m = gradient_orientation(img, 3)
     iso_go = isophotes(go, 5, (-np.pi, np.pi), .5, 'gaussian')
     imsave('isophotes/patterns-go.png', go*go_m)
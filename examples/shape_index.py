@@ -1,14 +1,13 @@
 #!/usr/bin/env python
 
 import numpy as np
-import scipy as sp
 from ipcv import shape_index
-from ipcv.util import imsave
+from ipcv.util import imread, imsave
 
 
 def visualize_si():
     ''' Visualize the shape index responses. '''
-    img = sp.misc.imread('data/patterns.png', flatten=True)
+    img = imread('data/patterns.png', flatten=True)
     si, si_c, si_o, si_om = shape_index(img, 2.5, orientations=True, fft=True)
     imsave('si/patterns-si.png', si)
     imsave('si/patterns-si_c.png', si_c)
@@ -20,7 +19,7 @@ def visualize_si():
 
 def visualize_si_orientation():
     ''' Visualize the shape index orientation. '''
-    img = sp.misc.imread('data/rings.png', flatten=True)
+    img = imread('data/rings.png', flatten=True)
     si, si_c, si_o, si_om = shape_index(img, 2.5, orientations=True, fft=True)
     import matplotlib.pyplot as plt
     plt.figure()
@@ -44,7 +43,7 @@ def visualize_si_orientation():
 def visualize_si_fiducial_orientation():
     ''' Visualize the shape index orientation with a fiducial coordinate
         system.'''
-    img = sp.misc.imread('data/rings.png', flatten=True)
+    img = imread('data/rings.png', flatten=True)
     si, si_c, si_o, si_om = shape_index(img, 2.5, orientations=True, fft=True)
     # No fiducial coordinate system.
     imsave('si/rings-si_o.png', si_o)
@@ -1,6 +1,7 @@
 from .bif import bif_hist, bif_colors, bif_response
 from .feature_histograms import go_hist, si_hist, josi_hist, osi_hist
 from .jetdescriptor import JetDescriptor
+from .misc import Workspace
 from .scalespace import scalespace, ScaleSpace, gradient_orientation, \
     shape_index
 
@@ -16,4 +17,5 @@ __all__ = ['bif_hist',
            'josi_hist',
            'JetDescriptor',
            'scalespace',
-           'ScaleSpace']
+           'ScaleSpace',
+           'Workspace']
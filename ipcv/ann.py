@@ -0,0 +1,179 @@
+import json
+import os
+import numpy as np
+
+from .matching import nearest_neighbors
+from .quantization import kmeans, ProductQuantizer
+
+
+class IVFPQIndex:
+    def __init__(self, n_lists=256, n_subspaces=10, n_centroids=256,
+                 nprobe=8):
+        ''' Inverted file index with product-quantized residuals.
+
+        A k-means coarse quantizer assigns every database vector to one of
+        n_lists inverted lists. The residual to the coarse centroid is
+        compressed with a product quantizer. A search only visits the nprobe
+        lists closest to the query and ranks their entries by asymmetric
+        distance, hence nprobe trades recall for speed.
+        '''
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.pq = ProductQuantizer(n_subspaces, n_centroids)
+        self.centroids = None
+        # Entries are stored in segments of (codes, ids, offsets). Within a
+        # segment the entries are sorted by inverted list; list l occupies
+        # codes[offsets[l]:offsets[l+1]]. add() appends a segment and merges
+        # segments of similar size such that an entry is merged O(log n)
+        # times and there are O(log n) segments.
+        self.segments = []
+
+    def __len__(self):
+        return sum(len(ids) for _, ids, _ in self.segments)
+
+    def _segment(self, labels, codes, ids):
+        order = np.argsort(labels, kind='mergesort')
+        counts = np.bincount(labels, minlength=self.n_lists)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return codes[order], ids[order], offsets
+
+    def _labels(self, offsets):
+        return np.repeat(np.arange(self.n_lists), np.diff(offsets))
+
+    def _merge(self, segments):
+        labels = np.concatenate([self._labels(o) for _, _, o in segments])
+        return self._segment(labels,
+                             np.concatenate([c for c, _, _ in segments]),
+                             np.concatenate([i for _, i, _ in segments]))
+
+    def _max_id(self):
+        ids = [np.max(ids) for _, ids, _ in self.segments if len(ids) > 0]
+        return max(ids) if ids else -1
+
+    def train(self, descs, n_iter=20, seed=None):
+        ''' Train the coarse quantizer and the residual product quantizer. '''
+        descs = np.asarray(descs)
+        self.centroids, labels = kmeans(descs, self.n_lists, n_iter, seed)
+        residuals = descs - self.centroids[labels]
+        self.pq.fit(residuals, n_iter, seed)
+        return self
+
+    def add(self, descs, ids=None):
+        ''' Add descriptors to the index. ids default to consecutive integers
+        following the current number of entries. '''
+        descs = np.asarray(descs)
+        if ids is None:
+            start = self._max_id() + 1
+            ids = np.arange(start, start+len(descs))
+        ids = np.asarray(ids, dtype=np.int64)
+        _, labels = nearest_neighbors(descs, self.centroids, k=1)
+        labels = labels[:, 0]
+        codes = self.pq.encode(descs - self.centroids[labels])
+        self.segments.append(self._segment(labels, codes, ids))
+        # Merge with the previous segment while it is not much larger.
+        # Memory-mapped segments are left alone.
+        while (len(self.segments) > 1
+               and 2*len(self.segments[-1][1]) >= len(self.segments[-2][1])
+               and not isinstance(self.segments[-2][1], np.memmap)):
+            merged = self._merge(self.segments[-2:])
+            self.segments[-2:] = [merged]
+
+    def build(self, descs, ids=None, n_iter=20, seed=None):
+        ''' Train the index on descs and add them. '''
+        self.train(descs, n_iter, seed)
+        self.add(descs, ids)
+        return self
+
+    def search(self, queries, k=1, nprobe=None):
+        ''' Approximate k-nearest neighbour search.
+
+        Returns
+        -------
+        dists: (n_queries, k) array
+            Approximate L2 distances in ascending order. Missing neighbours
+            have distance inf.
+        ids: (n_queries, k) array
+            Ids of the neighbours. Missing neighbours have id -1.
+        '''
+        if nprobe is None:
+            nprobe = self.nprobe
+        queries = np.asarray(queries)
+        nprobe = min(nprobe, self.n_lists)
+        _, probes = nearest_neighbors(queries, self.centroids, k=nprobe)
+        dists = np.full((len(queries), k), np.inf)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for q in range(len(queries)):
+            residuals = queries[q] - self.centroids[probes[q]]
+            tables = self.pq.distance_tables(residuals)
+            cand_dists = []
+            cand_ids = []
+            for seg_codes, seg_ids, offsets in self.segments:
+                # Gather the entries of all probed lists
+                starts = offsets[probes[q]]
+                lengths = offsets[probes[q]+1] - starts
+                n_cands = np.sum(lengths)
+                if n_cands == 0:
+                    continue
+                list_starts = np.cumsum(lengths) - lengths
+                entries = (np.arange(n_cands)
+                           + np.repeat(starts - list_starts, lengths))
+                probe_idxs = np.repeat(np.arange(len(lengths)), lengths)
+                codes = seg_codes[entries]
+                seg_dists = np.zeros(n_cands, dtype=tables.dtype)
+                for j in range(self.pq.n_subspaces):
+                    seg_dists += tables[probe_idxs, j, codes[:, j]]
+                cand_dists.append(seg_dists)
+                cand_ids.append(seg_ids[entries])
+            if not cand_dists:
+                continue
+            cand_dists = np.concatenate(cand_dists)
+            cand_ids = np.concatenate(cand_ids)
+            n = min(k, len(cand_dists))
+            if len(cand_dists) > n:
+                part = np.argpartition(cand_dists, n-1)[:n]
+                cand_dists = cand_dists[part]
+                cand_ids = cand_ids[part]
+            order = np.argsort(cand_dists)
+            dists[q, :n] = np.sqrt(cand_dists[order])
+            ids[q, :n] = cand_ids[order]
+        return dists, ids
+
+    def save(self, path):
+        ''' Save the index to the directory path. '''
+        if not os.path.exists(path):
+            os.makedirs(path)
+        with open(os.path.join(path, 'index.json'), 'w') as f:
+            json.dump({'n_lists': self.n_lists, 'nprobe': self.nprobe,
+                       'n_subspaces': self.pq.n_subspaces,
+                       'n_centroids': self.pq.n_centroids}, f)
+        np.save(os.path.join(path, 'centroids.npy'), self.centroids)
+        np.save(os.path.join(path, 'codebooks.npy'), self.pq.codebooks)
+        if len(self.segments) == 1:
+            codes, ids, offsets = self.segments[0]
+        elif self.segments:
+            codes, ids, offsets = self._merge(self.segments)
+        else:
+            codes = np.empty((0, self.pq.n_subspaces), dtype=np.uint8)
+            ids = np.empty(0, dtype=np.int64)
+            offsets = np.zeros(self.n_lists+1, dtype=np.int64)
+        np.save(os.path.join(path, 'codes.npy'), codes)
+        np.save(os.path.join(path, 'ids.npy'), ids)
+        np.save(os.path.join(path, 'offsets.npy'), offsets)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        ''' Load an index saved with save(). If mmap is True the codes and
+        ids are memory-mapped instead of read into memory. Entries added
+        to a memory-mapped index are kept in memory separately. '''
+        with open(os.path.join(path, 'index.json'), 'r') as f:
+            params = json.load(f)
+        index = cls(**params)
+        mmap_mode = 'r' if mmap else None
+        index.centroids = np.load(os.path.join(path, 'centroids.npy'))
+        index.pq.codebooks = np.load(os.path.join(path, 'codebooks.npy'))
+        codes = np.load(os.path.join(path, 'codes.npy'), mmap_mode=mmap_mode)
+        ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(path, 'offsets.npy'))
+        if len(ids) > 0:
+            index.segments = [(codes, ids, offsets)]
+        return index
@@ -1,47 +1,56 @@
 import numpy as np
-from scipy.ndimage.filters import gaussian_filter
-from .scalespace import scalespace
+from . import fused
+from .filtering import box_derivatives, gaussian_filter
 from .misc import normalize
+from .misc.workspace import get_workspace
+from .profiling import stage
+from .scalespace import spatial_filter_args
+from .feature_histograms import image_stack
 
 
 def bif_max(bif_r):
-    return np.argmax(bif_r, axis=2)
+    return np.argmax(bif_r, axis=-1)
 
 
-def bif_response(img, scale, eps=0.0, fft=False):
-    mode = 'reflect'
-    if eps > 0.0:
-        if fft:
-            L = scalespace(img, scale, order=(0, 0))
-        else:
-            L = gaussian_filter(img, scale, order=(0, 0), mode=mode)
-        bif_r = np.empty(img.shape + (7,))
-        bif_r[..., 6] = eps*L
-    else:
-        bif_r = np.empty(img.shape + (6,))
-
-    if fft:
-        Ly = scale*scalespace(img, scale, order=(1, 0))
-        Lx = scale*scalespace(img, scale, order=(0, 1))
-        Lyy = scale**2*scalespace(img, scale, order=(2, 0))
-        Lxy = scale**2*scalespace(img, scale, order=(1, 1))
-        Lxx = scale**2*scalespace(img, scale, order=(0, 2))
-    else:
-        Ly = scale*gaussian_filter(img, scale, order=(1, 0), mode=mode)
-        Lx = scale*gaussian_filter(img, scale, order=(0, 1), mode=mode)
-        Lyy = scale**2*gaussian_filter(img, scale, order=(2, 0), mode=mode)
-        Lxy = scale**2*gaussian_filter(img, scale, order=(1, 1), mode=mode)
-        Lxx = scale**2*gaussian_filter(img, scale, order=(0, 2), mode=mode)
+def bif_response(img, scale, eps=0.0, fft=False, workspace=None, box=False):
+    '''Basic image feature responses at the given scale.
 
-    lambd = Lyy+Lxx
-    gamma = np.sqrt((Lyy-Lxx)**2 + 4*Lxy**2)
+    img may be a single (h, w) image or a (n, h, w) stack of images that are
+    processed independently. If a Workspace is given, the returned
+    img.shape + (6,) or img.shape + (7,) array is a view of its buffers.
+    box=True approximates the Gaussian derivatives with box filters, see
+    filtering.box_derivatives().'''
+    ws = get_workspace(workspace, img)
+    nresponses = 7 if eps > 0.0 else 6
+    bif_r = ws.get('bif.r', img.shape + (nresponses,))
 
-    bif_r[..., 0] = 2*np.sqrt(Ly**2+Lx**2)
-    bif_r[..., 1] = lambd
-    bif_r[..., 2] = -lambd
-    bif_r[..., 3] = 2**(-.5)*(gamma+lambd)
-    bif_r[..., 4] = 2**(-.5)*(gamma-lambd)
-    bif_r[..., 5] = gamma
+    orders = [(1, 0), (0, 1), (2, 0), (1, 1), (0, 2)]
+    if eps > 0.0:
+        orders.append((0, 0))
+    derivs = [ws.get('bif.L%i%i' % order) for order in orders]
+    if fft and box:
+        raise ValueError('fft and box are mutually exclusive.')
+    if box:
+        with stage('box_filter'):
+            box_derivatives(img, scale, orders, derivs)
+    elif fft:
+        ss = ws.scalespace(scale, orders)
+        for L, deriv in zip(derivs, ss.compute(img)):
+            L[...] = deriv
+    else:
+        with stage('gaussian_filter'):
+            for L, order in zip(derivs, orders):
+                sigma, order = spatial_filter_args(img.ndim, scale, order)
+                gaussian_filter(img, sigma, order=order, output=L,
+                                mode='reflect')
+    Ly, Lx, Lyy, Lxy, Lxx = derivs[:5]
+    Ly *= scale
+    Lx *= scale
+    Lyy *= scale**2
+    Lxy *= scale**2
+    Lxx *= scale**2
+    L = derivs[5] if eps > 0.0 else None
+    fused.bif_response(Ly, Lx, Lyy, Lxy, Lxx, L, eps, bif_r)
 
     return bif_r
 
@@ -63,20 +72,63 @@ def bif_colors(bif_r):
 
 
 def bif_hist(img, n_scales=4, scale_min=1.0, scale_ratio=2.0, eps=0.0,
-             norm='l1'):
+             norm='l1', fft=False, workspace=None, batch=False):
+    '''Basic image feature histograms
+
+    Parameters
+    ----------
+    img: array
+        Input image(s), see go_hist() for the supported layouts.
+    n_scales: int
+        Number of scales.
+    scale_min: float
+        The smallest scale.
+    scale_ratio: float
+        The ratio between two consecutive scales.
+    eps: float
+        Threshold for classifying flat regions. 0 disables the flat class.
+    norm: str
+        Histogram normalization method.
+    fft: bool
+        Compute the image derivatives in the Fourier domain.
+    workspace: Workspace
+        Scratch buffers reused across calls on images of the same shape.
+    batch: bool
+        Interpret a 3-D img as a (N, h, w) batch instead of (h, w, c).
+
+    Returns
+    -------
+    hist: (nresponses**n_scales,) array
+        BIF histogram with nresponses = 7 if eps > 0 else 6. Stacked inputs
+        return one histogram per image and channel along the leading axes.
+    '''
     if eps > 0.0:
         nresponses = 7
     else:
         nresponses = 6
-    # Classify image structure at all scales
+    imgs, lead_shape = image_stack(img, batch)
+    ws = get_workspace(workspace, imgs)
+    bif_idx = ws.get('bif_hist.max', dtype=np.intp)
+    hist_idx = ws.get('bif_hist.idx', dtype=np.intp)
+    hist_idx[...] = 0
+    # Classify image structure at all scales and calculate histogram indices
+    # for all pixels
     scales = [scale_min*scale_ratio**n for n in range(n_scales)]
-    bif_maxes = [bif_max(bif_response(img, s, eps)) for s in scales]
-    bif_maxes = np.concatenate([b[..., np.newaxis] for b in bif_maxes], axis=2)
-    # Calculate histogram indices for all pixels
-    offsets = nresponses**np.arange(n_scales)
-    hist_idx = np.sum(bif_maxes * offsets[np.newaxis, np.newaxis, :], axis=2)
-    # Build histogram
-    hist_dims = nresponses**n_scales
-    hist = np.bincount(np.ravel(hist_idx), minlength=hist_dims)
-    hist = normalize(hist.astype(float), norm)
-    return hist
+    for n, s in enumerate(scales):
+        bif_r = bif_response(imgs, s, eps, fft, workspace=ws)
+        np.argmax(bif_r, axis=-1, out=bif_idx)
+        with stage('histogram'):
+            bif_idx *= nresponses**n
+            hist_idx += bif_idx
+    with stage('histogram'):
+        # Build histograms, offsetting the indices of each stacked image
+        hist_dims = nresponses**n_scales
+        n_imgs = 1 if imgs.ndim == 2 else imgs.shape[0]
+        if n_imgs > 1:
+            hist_idx += (np.arange(n_imgs)*hist_dims)[:, np.newaxis,
+                                                      np.newaxis]
+        hist = np.bincount(np.ravel(hist_idx), minlength=n_imgs*hist_dims)
+    if imgs.ndim == 2:
+        return normalize(hist, norm)
+    hist = normalize(np.reshape(hist, (n_imgs, hist_dims)), norm, axis=1)
+    return np.reshape(hist, lead_shape + (hist_dims,))
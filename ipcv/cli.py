@@ -0,0 +1,408 @@
+''' Command line interface, see 'ipcv --help'.
+
+'ipcv extract' computes descriptors for a manifest of images. The manifest is
+a text file with one image path per line; empty lines and lines starting with
+# are skipped and relative paths are relative to the manifest. Images are
+identified by their position in the manifest, i.e. a manifest may be
+extended but not reordered between runs. The descriptor config is a JSON
+file, e.g.
+
+    {"method": "jet_descriptor",
+     "detector": {"affine": true, "max_keypoints": 1000},
+     "descriptor": {"k": 4, "rings": 1},
+     "desc_dtype": "float32"}
+
+for jet descriptors at Hessian-Laplace keypoints (or on a regular grid with
+"dense": {"step": 8, "radius": 4.0} instead of "detector") and
+
+    {"method": "si_hist",
+     "params": {"n_scales": 4, "n_bins": 8},
+     "donut_params": {"n_donuts": 4, "radius_max": 200, "width_min": 30}}
+
+for a histogram per image. The images are split into shards by their manifest
+index and every shard is processed by a worker process writing to its own
+files in the output directory:
+
+- shard-NNNNN.kpb: a binary keypoint file (see util.KeypointWriter) holding
+  the keypoints and descriptors of all images of the shard. For histogram
+  methods every image yields a single record whose keypoint is the manifest
+  index of the image and whose descriptor is the flattened histogram.
+- shard-NNNNN.log: the checkpoint log, one line 'index n_records path' per
+  completed image in the order of the records in shard-NNNNN.kpb.
+
+A line is appended to the log (and synced to disk) only after the records of
+the image are written. Rerunning the same command skips the images in the
+logs, i.e. an interrupted run resumes where it stopped. Use iter_results() to
+read the results.
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+
+from .util import KeypointWriter, imread, read_keypoints_binary
+from .util.binary_keypoints import read_header
+
+
+_HIST_METHODS = ['go_hist', 'si_hist', 'josi_hist', 'bif_hist']
+_CONFIG_KEYS = {
+    'jet_descriptor': ['method', 'detector', 'dense', 'descriptor',
+                       'desc_dtype'],
+}
+for _method in _HIST_METHODS:
+    _CONFIG_KEYS[_method] = ['method', 'params', 'donut_params', 'desc_dtype']
+
+RUN_FILE = 'run.json'
+
+
+def read_manifest(path):
+    ''' Return the image paths listed in a manifest file. '''
+    items = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                items.append(line)
+    return items
+
+
+def shard_paths(output_dir, shard):
+    ''' Return the paths of the binary keypoint file and the checkpoint log
+    of a shard. '''
+    prefix = os.path.join(output_dir, 'shard-%05i' % shard)
+    return prefix + '.kpb', prefix + '.log'
+
+
+def read_checkpoint(path):
+    ''' Return the (index, n_records, path) entries of a checkpoint log.
+
+    A trailing incomplete line left by an interrupted write is ignored.
+    '''
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path) as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            index, n_records, item = line[:-1].split('\t', 2)
+            entries.append((int(index), int(n_records), item))
+    return entries
+
+
+def _repair_checkpoint(path):
+    ''' Truncate a checkpoint log after its last complete line. '''
+    if not os.path.exists(path):
+        return
+    with open(path, 'r+b') as f:
+        data = f.read()
+        f.truncate(data.rfind(b'\n') + 1)
+
+
+def iter_results(output_dir):
+    ''' Iterate over the results of 'ipcv extract' in output_dir.
+
+    Returns a generator yielding (index, path, keypoints, descs) for every
+    completed image. The arrays are memory mapped.
+    '''
+    for shard in range(_read_run(output_dir)['n_shards']):
+        kpb_path, log_path = shard_paths(output_dir, shard)
+        keypoints = descs = None
+        if os.path.exists(kpb_path):
+            keypoints, descs = read_keypoints_binary(kpb_path)
+        offset = 0
+        for index, n_records, item in read_checkpoint(log_path):
+            end = offset + n_records
+            if n_records == 0:
+                yield index, item, np.empty((0, 5)), None
+            else:
+                yield (index, item, keypoints[offset:end],
+                       None if descs is None else descs[offset:end])
+            offset = end
+
+
+def _read_run(output_dir):
+    with open(os.path.join(output_dir, RUN_FILE)) as f:
+        return json.load(f)
+
+
+class Extractor:
+    def __init__(self, config):
+        ''' Descriptor extraction as specified by a config dict, see the
+        module documentation. Calling the extractor with an image and its
+        manifest index returns a (keypoints, descs) pair. '''
+        self.method = config.get('method', 'jet_descriptor')
+        if self.method not in _CONFIG_KEYS:
+            raise ValueError('Invalid method %s.' % self.method)
+        for key in config:
+            if key not in _CONFIG_KEYS[self.method]:
+                raise ValueError('Invalid config key %s for method %s.'
+                                 % (key, self.method))
+        self.desc_dtype = config.get('desc_dtype')
+        if self.method == 'jet_descriptor':
+            from .jetdescriptor import JetDescriptor
+            if 'detector' in config and 'dense' in config:
+                raise ValueError('detector and dense are mutually '
+                                 'exclusive.')
+            self.detector = config.get('detector', {})
+            self.dense = config.get('dense')
+            self.descriptor = JetDescriptor(**config.get('descriptor', {}))
+            self.kp_dim = 5
+        else:
+            from .stream import _METHODS
+            from .feature_histograms import scales
+            self.fun = _METHODS[self.method]
+            self.params = dict(config.get('params', {}))
+            if self.method != 'bif_hist' and 'scales' not in self.params:
+                self.params['scales'] = scales(
+                    self.params.pop('n_scales', 4),
+                    self.params.pop('scale_min', 1.0),
+                    self.params.pop('scale_ratio', 2.0))
+            self.donut_params = config.get('donut_params')
+            if self.method == 'bif_hist' and self.donut_params is not None:
+                raise ValueError('bif_hist does not support spatial weights.')
+            self._weights = {}
+            self.kp_dim = 1
+
+    def __call__(self, img, index):
+        if self.method == 'jet_descriptor':
+            if self.dense is not None:
+                return self.descriptor.compute_dense(img, **self.dense)
+            from .detector import hessian_laplace
+            keypoints = hessian_laplace(img, **self.detector)
+            if len(keypoints) == 0:
+                return keypoints, None
+            return keypoints, self.descriptor.compute(img, keypoints)
+        params = self.params
+        if self.donut_params is not None:
+            weights = self._weights.get(img.shape)
+            if weights is None:
+                from .misc import donuts
+                weights = donuts(img.shape, **self.donut_params)
+                self._weights[img.shape] = weights
+            params = dict(params, weights=weights)
+        hist = self.fun(img, **params)
+        return np.array([[index]], dtype=float), np.reshape(hist, (1, -1))
+
+
+def _run_shard(task):
+    ''' Process the pending images of a shard in a worker process. '''
+    shard, items, root, config, output_dir, progress = task
+    extractor = Extractor(config)
+    kpb_path, log_path = shard_paths(output_dir, shard)
+    _repair_checkpoint(log_path)
+    n_logged = sum(n for _, n, _ in read_checkpoint(log_path))
+    writer = None
+    if os.path.exists(kpb_path):
+        # Discard records of an image that was not logged before the run
+        # was interrupted.
+        header = read_header(kpb_path)
+        writer = KeypointWriter(kpb_path, header['kp_dim'],
+                                header['desc_dim'], header['kp_dtype'],
+                                header['desc_dtype'], append=True)
+        if writer.n_keypoints < n_logged:
+            raise ValueError('%s holds fewer records than logged in %s.'
+                             % (kpb_path, log_path))
+        writer.truncate(n_logged)
+    elif n_logged > 0:
+        raise ValueError('%s is missing.' % kpb_path)
+
+    log = open(log_path, 'a')
+    try:
+        for index, item in items:
+            try:
+                img = imread(os.path.join(root, item), flatten=True)/255.
+                keypoints, descs = extractor(img, index)
+            except Exception as e:
+                progress.put((0, 0, '%s: %s' % (item, e)))
+                continue
+            if len(keypoints) > 0:
+                if writer is None:
+                    desc_dim = 0 if descs is None else descs.shape[1]
+                    desc_dtype = extractor.desc_dtype
+                    if desc_dtype is None:
+                        desc_dtype = np.float64 if descs is None \
+                            else descs.dtype
+                    writer = KeypointWriter(kpb_path, extractor.kp_dim,
+                                            desc_dim, desc_dtype=desc_dtype)
+                writer.write(keypoints, descs)
+                writer.flush(sync=True)
+            log.write('%i\t%i\t%s\n' % (index, len(keypoints), item))
+            log.flush()
+            os.fsync(log.fileno())
+            progress.put((1, len(keypoints), None))
+    finally:
+        log.close()
+        if writer is not None:
+            writer.close()
+
+
+class _Progress:
+    def __init__(self, n_total, n_done, stream=sys.stderr):
+        self.n_total = n_total
+        self.n_done = n_done
+        self.n_images = 0
+        self.n_keypoints = 0
+        self.n_failed = 0
+        self.stream = stream
+        self.start = time.time()
+
+    def update(self, n_images, n_keypoints, error):
+        self.n_images += n_images
+        self.n_keypoints += n_keypoints
+        if error is not None:
+            self.n_failed += 1
+            self.stream.write('\nFailed: %s\n' % error)
+
+    def report(self, final=False):
+        elapsed = max(time.time() - self.start, 1e-9)
+        self.stream.write(
+            '\r%i/%i images, %.1f images/s, %.1f keypoints/s, %i failed'
+            % (self.n_done + self.n_images, self.n_total,
+               self.n_images/elapsed, self.n_keypoints/elapsed,
+               self.n_failed))
+        if final or not self.stream.isatty():
+            self.stream.write('\n')
+        self.stream.flush()
+
+
+def extract(manifest, config, output_dir, n_workers=None, n_shards=None,
+            report_interval=1.0):
+    '''Compute descriptors for the images of a manifest, see the module
+    documentation.
+
+    Parameters
+    ----------
+    manifest: str
+        Manifest file path.
+    config: dict
+        Descriptor config.
+    output_dir: str
+        Output directory. If it holds the results of a previous run with the
+        same config, only the images not completed by that run are
+        processed.
+    n_workers: int
+        Number of worker processes. Defaults to the number of CPUs.
+    n_shards: int
+        Number of shards. Defaults to n_workers for a new output directory
+        and to the number of shards of the previous run otherwise.
+    report_interval: float
+        Seconds between throughput reports on stderr.
+
+    Returns
+    -------
+    n_failed: int
+        Number of images that failed. They are retried by the next run.
+    '''
+    Extractor(config)
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    items = read_manifest(manifest)
+    root = os.path.dirname(os.path.abspath(manifest))
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    if os.path.exists(os.path.join(output_dir, RUN_FILE)):
+        run = _read_run(output_dir)
+        if run['config'] != config:
+            raise ValueError('%s holds results for a different config.'
+                             % output_dir)
+        if n_shards is not None and n_shards != run['n_shards']:
+            raise ValueError('%s holds results for %i shards.'
+                             % (output_dir, run['n_shards']))
+        n_shards = run['n_shards']
+    else:
+        if n_shards is None:
+            n_shards = n_workers
+        with open(os.path.join(output_dir, RUN_FILE), 'w') as f:
+            json.dump({'config': config, 'n_shards': n_shards}, f, indent=2)
+
+    done = set()
+    for shard in range(n_shards):
+        for index, _, item in read_checkpoint(shard_paths(output_dir,
+                                                          shard)[1]):
+            if index >= len(items) or items[index] != item:
+                raise ValueError('Image %i of the checkpoint log (%s) does '
+                                 'not match the manifest.' % (index, item))
+            done.add(index)
+    pending = [[] for _ in range(n_shards)]
+    for index, item in enumerate(items):
+        if index not in done:
+            pending[index % n_shards].append((index, item))
+
+    progress = _Progress(len(items), len(done))
+    shards = [s for s in range(n_shards) if pending[s]]
+    if not shards:
+        progress.report(final=True)
+        return 0
+    manager = multiprocessing.Manager()
+    pool = multiprocessing.Pool(min(n_workers, len(shards)))
+    try:
+        queue = manager.Queue()
+        tasks = [(s, pending[s], root, config, output_dir, queue)
+                 for s in shards]
+        result = pool.map_async(_run_shard, tasks)
+        last_report = time.time()
+        while True:
+            finished = result.ready()
+            # Drain the queue before the last report
+            while not queue.empty():
+                progress.update(*queue.get())
+            if finished:
+                break
+            if time.time() - last_report >= report_interval:
+                progress.report()
+                last_report = time.time()
+            result.wait(min(report_interval, 0.1))
+        progress.report(final=True)
+        # Re-raise errors in the workers
+        result.get()
+    finally:
+        pool.terminate()
+        pool.join()
+        manager.shutdown()
+    return progress.n_failed
+
+
+def main(argv=None):
+    description = '''
+    Image processing/computer vision toolkit. Run 'ipcv <command> --help' for
+    help on a command.
+    '''
+    parser = argparse.ArgumentParser(prog='ipcv', description=description)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    description = '''
+    Compute descriptors for a manifest of images in parallel worker
+    processes. Results are written to per-shard binary keypoint files in the
+    output directory along with checkpoint logs of the completed images.
+    Rerun the command to resume an interrupted run. E.g. 'ipcv extract
+    images.txt -c jet.json -o results'.
+    '''
+    p = subparsers.add_parser('extract', description=description,
+                              help='Compute descriptors for many images.')
+    p.add_argument('manifest', type=str,
+                   help='Text file with one image path per line.')
+    p.add_argument('-c', '--config_file', type=str, required=True,
+                   help='JSON descriptor config file.')
+    p.add_argument('-o', '--output_dir', type=str, required=True,
+                   help='Output directory.')
+    p.add_argument('-j', '--workers', type=int, default=None,
+                   help='Number of worker processes (default: number of '
+                        'CPUs).')
+    p.add_argument('--shards', type=int, default=None,
+                   help='Number of shards (default: number of workers).')
+    p.add_argument('--report_interval', type=float, default=1.0,
+                   help='Seconds between throughput reports.')
+    args = parser.parse_args(argv)
+
+    with open(args.config_file) as f:
+        config = json.load(f)
+    try:
+        n_failed = extract(args.manifest, config, args.output_dir,
+                           args.workers, args.shards, args.report_interval)
+    except ValueError as e:
+        parser.exit(2, 'ipcv: error: %s\n' % e)
+    return 1 if n_failed else 0
@@ -0,0 +1,146 @@
+import numpy as np
+
+from .feature_histograms import scales as scale_list
+from .filtering import gaussian_filter
+from .misc import Workspace
+from .profiling import stage
+from .scalespace import _derivatives
+
+
+def _scale_responses(img, scales, fft, box):
+    '''Scale normalized Hessian determinant and Laplacian at all scales
+    stacked in (n_scales, h, w) arrays.'''
+    ws = Workspace(img.shape, np.float64)
+    dets = np.empty((len(scales),) + img.shape)
+    laps = np.empty((len(scales),) + img.shape)
+    for i, s in enumerate(scales):
+        Lyy, Lxy, Lxx = _derivatives(img, s, [(2, 0), (1, 1), (0, 2)], fft,
+                                     box, ws, 'hl.')
+        np.multiply(Lxx, Lyy, out=dets[i])
+        Lxy **= 2
+        dets[i] -= Lxy
+        np.add(Lxx, Lyy, out=laps[i])
+        np.abs(laps[i], out=laps[i])
+    return dets, laps
+
+
+def _second_moments(img, scale, ys, xs, derivation_ratio):
+    '''Second moment matrices at (ys, xs) with integration scale scale.'''
+    sd = derivation_ratio*scale
+    Ly = gaussian_filter(img, sd, order=(1, 0), mode='reflect')*sd
+    Lx = gaussian_filter(img, sd, order=(0, 1), mode='reflect')*sd
+    mu = np.empty((len(ys), 2, 2))
+    for (i, j), prod in [((0, 0), Lx*Lx), ((0, 1), Lx*Ly), ((1, 1), Ly*Ly)]:
+        mu[:, i, j] = gaussian_filter(prod, scale, mode='reflect')[ys, xs]
+    mu[:, 1, 0] = mu[:, 0, 1]
+    return mu
+
+
+def _affine_shapes(mu, max_anisotropy):
+    '''Normalize second moment matrices to unit determinant and limit their
+    eigenvalue ratio to max_anisotropy**2.'''
+    evals, evecs = np.linalg.eigh(mu)
+    evals = np.maximum(evals, 1e-12)
+    evals[:, 0] = np.maximum(evals[:, 0], evals[:, 1]/max_anisotropy**2)
+    evals /= np.sqrt(evals[:, :1]*evals[:, 1:])
+    return np.einsum('nij,nj,nkj->nik', evecs, evals, evecs)
+
+
+def hessian_laplace(img, n_scales=12, scale_min=1.2, scale_ratio=1.2,
+                    threshold=1e-3, region_scale=3.0, affine=False,
+                    max_anisotropy=4.0, derivation_ratio=0.7, border=None,
+                    max_keypoints=None, fft=False, box=False):
+    '''Hessian-Laplace and Hessian-affine interest point detector.
+
+    Points are located at spatial maxima of the scale normalized Hessian
+    determinant at each scale. Their characteristic scale is selected where
+    the absolute scale normalized Laplacian attains a maximum over scale.
+    Non-maximum suppression is vectorized over all scales with
+    scipy.ndimage.maximum_filter(). With affine=True the circular regions
+    are replaced by ellipses estimated from the second moment matrix at the
+    characteristic scale (a single step of affine shape adaptation).
+
+    Parameters
+    ----------
+    img: (h, w) array
+        Input image with intensities in [0, 1].
+    n_scales: int
+        Number of scales.
+    scale_min: float
+        The smallest scale.
+    scale_ratio: float
+        The ratio between two consecutive scales.
+    threshold: float
+        Minimum scale normalized Hessian determinant.
+    region_scale: float
+        Radius of the keypoint regions relative to their scale.
+    affine: bool
+        Estimate elliptic (affine) regions.
+    max_anisotropy: float
+        Maximum ratio between the axes of affine regions.
+    derivation_ratio: float
+        Ratio between the derivation and integration scale of the second
+        moment matrix.
+    border: int
+        Discard points closer than border pixels to the image border.
+        Defaults to the radius of the smallest region.
+    max_keypoints: int
+        Keep only the strongest keypoints.
+    fft, box: bool
+        Derivative backend, see shape_index().
+
+    Returns
+    -------
+    keypoints: (n_keypoints, 5) array
+        Keypoints (x, y, a, b, c) with 1-based coordinates in the layout
+        returned by util.read_keypoints(), sorted by decreasing response.
+        The keypoint regions are a(x-u)**2 + 2b(x-u)(y-v) + c(y-v)**2 = 1.
+    '''
+    from scipy.ndimage import maximum_filter
+    img = np.asarray(img, dtype=float)
+    if img.ndim != 2:
+        raise ValueError('img must be 2-D.')
+    scales = scale_list(n_scales, scale_min, scale_ratio)
+    if border is None:
+        border = int(np.ceil(region_scale*scale_min))
+
+    dets, laps = _scale_responses(img, scales, fft, box)
+    with stage('nms'):
+        # Spatial maxima of the determinant at every scale
+        peaks = dets == maximum_filter(dets, size=(1, 3, 3), mode='nearest')
+        peaks &= dets > threshold
+        # Characteristic scales: maxima of the Laplacian over scale
+        peaks &= laps == maximum_filter(laps, size=(3, 1, 1),
+                                        mode='nearest')
+        # Scale maxima at the first and last scale are not localized.
+        peaks[0] = False
+        peaks[-1] = False
+        peaks[:, :border] = False
+        peaks[:, img.shape[0]-border:] = False
+        peaks[:, :, :border] = False
+        peaks[:, :, img.shape[1]-border:] = False
+        s_idx, ys, xs = np.nonzero(peaks)
+        responses = dets[s_idx, ys, xs]
+    order = np.argsort(-responses, kind='stable')
+    if max_keypoints is not None:
+        order = order[:max_keypoints]
+    s_idx, ys, xs = s_idx[order], ys[order], xs[order]
+
+    n_keypoints = len(s_idx)
+    shapes = np.empty((n_keypoints, 2, 2))
+    shapes[:] = np.eye(2)
+    if affine:
+        for i in np.unique(s_idx):
+            mask = s_idx == i
+            mu = _second_moments(img, scales[i], ys[mask], xs[mask],
+                                 derivation_ratio)
+            shapes[mask] = _affine_shapes(mu, max_anisotropy)
+
+    radii = region_scale*scales[s_idx]
+    keypoints = np.empty((n_keypoints, 5))
+    keypoints[:, 0] = xs + 1
+    keypoints[:, 1] = ys + 1
+    keypoints[:, 2] = shapes[:, 0, 0]/radii**2
+    keypoints[:, 3] = shapes[:, 0, 1]/radii**2
+    keypoints[:, 4] = shapes[:, 1, 1]/radii**2
+    return keypoints
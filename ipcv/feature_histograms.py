@@ -1,6 +1,8 @@
 import numpy as np
 from .scalespace import gradient_orientation, shape_index
 from .misc import normalize, isophotes
+from .misc.workspace import get_workspace
+from .profiling import stage
 
 
 def scales(n_scales=4, scale_min=1.0, scale_ratio=2.0):
@@ -22,16 +24,50 @@ def scales(n_scales=4, scale_min=1.0, scale_ratio=2.0):
     return scale_min*scale_ratio**np.arange(n_scales)
 
 
+def image_stack(img, batch=False):
+    '''Return img as a single (h, w) image or a (n, h, w) stack of images
+    together with the leading shape of the stacked histograms.
+
+    Supported layouts are (h, w), (h, w, c), (N, h, w) if batch is True and
+    (N, h, w, c).
+    '''
+    img = np.asarray(img)
+    if img.ndim == 2:
+        return img, ()
+    if img.ndim == 3 and batch:
+        return img, img.shape[:1]
+    if img.ndim == 3:
+        lead_shape = img.shape[2:]
+    elif img.ndim == 4:
+        lead_shape = img.shape[:1] + img.shape[3:]
+    else:
+        raise ValueError('Invalid image shape %s.' % (img.shape,))
+    # Move the channels next to the images and stack them
+    imgs = np.moveaxis(img, -1, -3)
+    imgs = np.ascontiguousarray(np.reshape(imgs, (-1,) + imgs.shape[-2:]))
+    return imgs, lead_shape
+
+
+def _finish(hists, norm, lead_shape):
+    '''Normalize hists and move the stack axis, if any, to the front.'''
+    if lead_shape == ():
+        return normalize(hists, norm, out=hists)
+    normalize(hists, norm, axis=tuple(range(hists.ndim-1)), out=hists)
+    return np.reshape(np.moveaxis(hists, -1, 0), lead_shape + hists.shape[:-1])
+
+
 def go_hist(img, scales=[1,2,4,8], n_bins=8, tonal_scale=0.4, norm='l1',
-            weights=None, signed=True, ori_offsets=None):
+            weights=None, signed=True, ori_offsets=None, fft=False,
+            workspace=None, batch=False):
     '''Gradient orientation histograms
 
     Compute a multi-scale gradient orientation histogram for the given image.
 
     Parameters
     ----------
-    img: (h, w) array.
-        Input image.
+    img: array
+        Input image of shape (h, w), (h, w, c), (N, h, w) with batch=True or
+        (N, h, w, c). Images and channels are processed independently.
     scales: array
         Scales at which gradients are extracted.
     n_bins: int
@@ -46,48 +82,67 @@ def go_hist(img, scales=[1,2,4,8], n_bins=8, tonal_scale=0.4, norm='l1',
         Pixel-wise offsets for the gradient orientations.
     weights: A list of (h, w) arrays
         Pixel-wise spatial weights to adjust histogram contributions.
+    fft: bool
+        Compute the image derivatives in the Fourier domain.
+    workspace: Workspace
+        Scratch buffers reused across calls on images of the same shape. For
+        stacked inputs its shape is that of the (n, h, w) image stack.
+    batch: bool
+        Interpret a 3-D img as a (N, h, w) batch instead of (h, w, c).
 
     Returns
     -------
     hists: (n_bins, len(scales)) or (n_bins, len(scales), len(weights)) array
         Gradient orientation histograms for all combinations of scales and
-        spatial weights.
+        spatial weights. Stacked inputs prepend the axes (c,), (N,) or (N, c)
+        to the histogram shape.
     '''
     hists_shape = (n_bins, len(scales))
     if weights is not None:
         hists_shape += (len(weights), )
-    hists = np.empty(hists_shape)
+    imgs, lead_shape = image_stack(img, batch)
+    hists = np.empty(hists_shape + imgs.shape[:-2])
     if signed:
         limits = (-np.pi, np.pi)
     else:
         limits = (-np.pi/2, np.pi/2)
+    ws = get_workspace(workspace, imgs)
+    iso_shape = (n_bins,) + imgs.shape
     for s_idx, s in enumerate(scales):
-        go, go_m = gradient_orientation(img, s, signed)
+        go, go_m = gradient_orientation(imgs, s, signed, fft, workspace=ws)
         if ori_offsets is not None:
+            go -= ori_offsets
             if signed:
-                go = np.mod(go-ori_offsets, 2*np.pi)
+                np.mod(go, 2*np.pi, out=go)
+            else:
+                np.mod(go, np.pi, out=go)
+                go -= np.pi/2
+        go_iso = isophotes(go, n_bins, limits, tonal_scale, 'von_mises',
+                           out=ws.get('go_hist.iso', iso_shape))
+        go_iso *= go_m
+        with stage('histogram'):
+            if weights is None:
+                np.sum(go_iso, axis=(-2, -1), out=hists[:, s_idx])
             else:
-                go = np.mod(go-ori_offsets, np.pi)-np.pi/2
-        go_iso = isophotes(go, n_bins, limits, tonal_scale, 'von_mises') * go_m
-        if weights is None:
-            hists[:, s_idx] = np.sum(go_iso, axis=(1, 2))
-        else:
-            for w_idx, w in enumerate(weights):
-                hists[:, s_idx, w_idx] = np.sum(go_iso*w, axis=(1, 2))
-    hists = normalize(hists, norm)
-    return hists
+                weighted = ws.get('go_hist.weighted', iso_shape)
+                for w_idx, w in enumerate(weights):
+                    np.multiply(go_iso, w, out=weighted)
+                    np.sum(weighted, axis=(-2, -1),
+                           out=hists[:, s_idx, w_idx])
+    return _finish(hists, norm, lead_shape)
 
 
 def si_hist(img, scales=[1,2,4,8], n_bins=8, tonal_scale=0.25, norm='l1',
-            weights=None):
+            weights=None, fft=False, workspace=None, batch=False):
     '''Shape index histograms
 
     Compute a multi-scale shape index histogram for the given image.
 
     Parameters
     ----------
-    img: (h, w) array.
-        Input image.
+    img: array
+        Input image of shape (h, w), (h, w, c), (N, h, w) with batch=True or
+        (N, h, w, c). Images and channels are processed independently.
     scales: array
         Scales at which gradients are extracted.
     n_bins: int
@@ -98,39 +153,57 @@ def si_hist(img, scales=[1,2,4,8], n_bins=8, tonal_scale=0.25, norm='l1',
         Histogram normalization method.
     weights: A list of (h, w) arrays
         Pixel-wise spatial weights to adjust histogram contributions.
+    fft: bool
+        Compute the image derivatives in the Fourier domain.
+    workspace: Workspace
+        Scratch buffers reused across calls on images of the same shape. For
+        stacked inputs its shape is that of the (n, h, w) image stack.
+    batch: bool
+        Interpret a 3-D img as a (N, h, w) batch instead of (h, w, c).
 
     Returns
     -------
     hists: (n_bins, len(scales)) or (n_bins, len(scales), len(weights)) array
         Shape index histograms for all combinations of scales and spatial
-        weights.
+        weights. Stacked inputs prepend the axes (c,), (N,) or (N, c) to the
+        histogram shape.
     '''
     hists_shape = (n_bins, len(scales))
     if weights is not None:
         hists_shape += (len(weights),)
-    hists = np.empty(hists_shape)
+    imgs, lead_shape = image_stack(img, batch)
+    hists = np.empty(hists_shape + imgs.shape[:-2])
+    ws = get_workspace(workspace, imgs)
+    iso_shape = (n_bins,) + imgs.shape
     for s_idx, s in enumerate(scales):
-        si, si_c = shape_index(img, s)
-        si_iso = isophotes(si, n_bins, (-np.pi/2, np.pi/2), tonal_scale)*si_c
-        if weights is None:
-            hists[:, s_idx] = np.sum(si_iso, axis=(1, 2))
-        else:
-            for w_idx, w in enumerate(weights):
-                hists[:, s_idx, w_idx] = np.sum(si_iso*w, axis=(1, 2))
-    hists = normalize(hists, norm)
-    return hists
+        si, si_c = shape_index(imgs, s, fft=fft, workspace=ws)
+        si_iso = isophotes(si, n_bins, (-np.pi/2, np.pi/2), tonal_scale,
+                           out=ws.get('si_hist.iso', iso_shape))
+        si_iso *= si_c
+        with stage('histogram'):
+            if weights is None:
+                np.sum(si_iso, axis=(-2, -1), out=hists[:, s_idx])
+            else:
+                weighted = ws.get('si_hist.weighted', iso_shape)
+                for w_idx, w in enumerate(weights):
+                    np.multiply(si_iso, w, out=weighted)
+                    np.sum(weighted, axis=(-2, -1),
+                           out=hists[:, s_idx, w_idx])
+    return _finish(hists, norm, lead_shape)
 
 
 def josi_hist(img, scales=[1,2,4,8], n_bins=8, tonal_scale=0.25, ori_n_bins=8,
-              ori_tonal_scale=0.25, norm='l1', weights=None, ori_offsets=None):
+              ori_tonal_scale=0.25, norm='l1', weights=None, ori_offsets=None,
+              fft=False, workspace=None, batch=False):
     '''Joint oriented shape index histograms
 
     Compute a multi-scale oriented shape index histogram for the given image.
 
     Parameters
     ----------
-    img: (h, w) array.
-        Input image.
+    img: array
+        Input image of shape (h, w), (h, w, c), (N, h, w) with batch=True or
+        (N, h, w, c). Images and channels are processed independently.
     scales: array
         Scales at which gradients are extracted.
     n_bins: int
@@ -147,38 +220,63 @@ def josi_hist(img, scales=[1,2,4,8], n_bins=8, tonal_scale=0.25, ori_n_bins=8,
         Pixel-wise spatial weights to adjust histogram contributions.
     ori_offsets: (h, w) array
         Pixel-wise offsets for the shape index orientations.
+    fft: bool
+        Compute the image derivatives in the Fourier domain.
+    workspace: Workspace
+        Scratch buffers reused across calls on images of the same shape. For
+        stacked inputs its shape is that of the (n, h, w) image stack.
+    batch: bool
+        Interpret a 3-D img as a (N, h, w) batch instead of (h, w, c).
 
     Returns
     -------
     hists: array
         Joint oriented shape index histograms for all combinations of scales
         and spatial weights are returned as a (n_bins, ori_n_bins, len(scales))
-        or (n_bins, ori_n_bins, len(scales), len(weights)) array.
+        or (n_bins, ori_n_bins, len(scales), len(weights)) array. Stacked
+        inputs prepend the axes (c,), (N,) or (N, c) to the histogram
+        shape.
     '''
     if weights is None:
         hists_shape = (n_bins, ori_n_bins, len(scales))
     else:
         hists_shape = (n_bins, ori_n_bins, len(scales), len(weights))
-    hists = np.empty(hists_shape)
+    imgs, lead_shape = image_stack(img, batch)
+    hists = np.empty(hists_shape + imgs.shape[:-2])
+    ws = get_workspace(workspace, imgs)
+    iso_j_shape = (n_bins, ori_n_bins) + imgs.shape
     for s_idx, s in enumerate(scales):
-        si, si_c, si_o, si_om = shape_index(img, s, orientations=True)
+        si, si_c, si_o, si_om = shape_index(imgs, s, orientations=True,
+                                            fft=fft, workspace=ws)
         if ori_offsets is not None:
-            si_o = np.mod(si_o+ori_offsets, np.pi)-np.pi/2
+            si_o += ori_offsets
+            np.mod(si_o, np.pi, out=si_o)
+            si_o -= np.pi/2
         # Smooth bin contributions (= soft isophote images)
-        iso_si = isophotes(si, n_bins, (-np.pi/2, np.pi/2), tonal_scale)
+        iso_si = isophotes(si, n_bins, (-np.pi/2, np.pi/2), tonal_scale,
+                           out=ws.get('josi_hist.iso', (n_bins,) + imgs.shape))
         iso_si_o = isophotes(si_o, ori_n_bins, (-np.pi/2, np.pi/2),
-                             ori_tonal_scale, 'von_mises')
-        # Bin contributions for the joint histogram
-        iso_j = (iso_si[:, np.newaxis, ...] * si_c
-                 * iso_si_o[np.newaxis, ...] * si_om)
-        # Summarize bin contributions in the joint histograms
-        if weights is None:
-            hists[:, :, s_idx] = np.sum(iso_j, axis=(2, 3))
-        else:
-            for w_idx, w in enumerate(weights):
-                hists[:, :, s_idx, w_idx] = np.sum(iso_j*w, axis=(2, 3))
-    hists = normalize(hists, norm)
-    return hists
+                             ori_tonal_scale, 'von_mises',
+                             out=ws.get('josi_hist.iso_o',
+                                        (ori_n_bins,) + imgs.shape))
+        with stage('histogram'):
+            # Bin contributions for the joint histogram
+            # iso_j = iso_si * si_c * iso_si_o * si_om
+            iso_j = ws.get('josi_hist.iso_j', iso_j_shape)
+            iso_si *= si_c
+            np.multiply(iso_si[:, np.newaxis, ...], iso_si_o[np.newaxis, ...],
+                        out=iso_j)
+            iso_j *= si_om
+            # Summarize bin contributions in the joint histograms
+            if weights is None:
+                np.sum(iso_j, axis=(-2, -1), out=hists[:, :, s_idx])
+            else:
+                weighted = ws.get('josi_hist.weighted', iso_j_shape)
+                for w_idx, w in enumerate(weights):
+                    np.multiply(iso_j, w, out=weighted)
+                    np.sum(weighted, axis=(-2, -1),
+                           out=hists[:, :, s_idx, w_idx])
+    return _finish(hists, norm, lead_shape)
 
 
 def osi_hist(img, scales=[1,2,4,8], n_bins=8, tonal_scale=0.25, ori_n_bins=8,
@@ -0,0 +1,249 @@
+import os
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+_n_threads = int(os.environ.get('IPCV_NUM_THREADS', 1))
+# One executor per thread count, such that calls with different thread
+# counts never shut down an executor in use by another thread.
+_executors = {}
+_lock = threading.Lock()
+
+# Images smaller than this are filtered serially.
+_MIN_PARALLEL_SIZE = 128*128
+
+
+def set_num_threads(n_threads):
+    ''' Set the number of threads used by gaussian_filter(). The default is
+    read from the IPCV_NUM_THREADS environment variable and is 1. '''
+    global _n_threads
+    if n_threads < 1:
+        raise ValueError('n_threads must be positive.')
+    _n_threads = int(n_threads)
+
+
+def get_num_threads():
+    return _n_threads
+
+
+def _get_executor(n_threads):
+    with _lock:
+        executor = _executors.get(n_threads)
+        if executor is None:
+            executor = ThreadPoolExecutor(n_threads)
+            _executors[n_threads] = executor
+        return executor
+
+
+def _sequence(value, ndim):
+    if np.isscalar(value):
+        return [value]*ndim
+    if len(value) != ndim:
+        raise ValueError('Sequence argument must have length equal to the '
+                         'number of image dimensions.')
+    return list(value)
+
+
+def gaussian_filter(img, sigma, order=0, output=None, mode='reflect',
+                    truncate=4.0, n_threads=None):
+    '''Multi-threaded Gaussian filter.
+
+    A drop-in replacement for scipy.ndimage.gaussian_filter(). As there, the
+    filter is applied as a sequence of 1-D passes, one per axis. Each pass is
+    split into strips perpendicular to the filtering axis which are filtered
+    in parallel; the 1-D filter of a line does not depend on other lines, so
+    the result is identical to the serial filter.
+
+    Parameters
+    ----------
+    img: array
+        Input image.
+    sigma: float or sequence of floats
+        Standard deviation of the Gaussian per axis.
+    order: int or sequence of ints
+        Derivative order per axis.
+    output: array
+        Optional output array. Defaults to an array of the input dtype.
+    mode: str
+        Boundary mode, see scipy.ndimage.
+    truncate: float
+        Truncate the filter at this many standard deviations.
+    n_threads: int
+        Number of threads. Defaults to set_num_threads().
+
+    Returns
+    -------
+    output: array
+        Filtered image.
+    '''
+    import scipy.ndimage
+    img = np.asarray(img)
+    if n_threads is None:
+        n_threads = _n_threads
+    if n_threads <= 1 or img.size < _MIN_PARALLEL_SIZE or img.ndim < 2:
+        return scipy.ndimage.gaussian_filter(img, sigma, order, output, mode,
+                                             truncate=truncate)
+    if output is None:
+        output = np.empty(img.shape, dtype=img.dtype)
+    elif output.shape != img.shape:
+        raise ValueError('output shape %s does not match image shape %s.'
+                         % (output.shape, img.shape))
+    sigmas = _sequence(sigma, img.ndim)
+    orders = _sequence(order, img.ndim)
+    executor = _get_executor(n_threads)
+
+    src = img
+    for axis in range(img.ndim):
+        if sigmas[axis] <= 1e-15:
+            # scipy skips axes with vanishing sigma as well.
+            continue
+        # Split along the longest of the other axes.
+        other = max((a for a in range(img.ndim) if a != axis),
+                    key=lambda a: img.shape[a])
+        bounds = np.linspace(0, img.shape[other], n_threads+1).astype(int)
+
+        def filter_strip(strip, src=src, axis=axis, other=other):
+            idx = [slice(None)]*img.ndim
+            idx[other] = slice(*strip)
+            idx = tuple(idx)
+            scipy.ndimage.gaussian_filter1d(src[idx], sigmas[axis], axis,
+                                            orders[axis], output=output[idx],
+                                            mode=mode, truncate=truncate)
+
+        strips = [(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:])
+                  if hi > lo]
+        list(executor.map(filter_strip, strips))
+        src = output
+    if src is img:
+        output[...] = img
+    return output
+
+
+def _box_sizes(scale):
+    '''Box stencil sizes approximating Gaussian derivatives at scale.
+
+    The sizes are chosen such that the stencils match the second order
+    Taylor expansion of the Gaussian derivative filters in the Fourier
+    domain, i.e. they have the same variance. Returns
+    (r, a, m, w): the half width r of the smoothing boxes, the length a of
+    the lobes of the first order and mixed stencils and the half width m of
+    the center lobe and the width w of the outer lobes of the second order
+    stencils.
+    '''
+    n = np.arange(int(4*scale) + 3)
+    # Box of 2r+1 pixels: variance r(r+1)/3 = scale**2
+    r = int(np.argmin(np.abs(n*(n+1) - 3*scale**2)))
+    # Antisymmetric lobes 1..a: sum(k**3)/sum(k) = a(a+1)/2 = 3*scale**2
+    a = max(1, int(np.argmin(np.abs(n*(n+1) - 6*scale**2))))
+    # Second order stencil: outer lobes m+1..m+w weighted 1, center lobe
+    # -m..m weighted -2w/(2m+1). Match sum(v*k**4)/sum(v*k**2) = 6*scale**2.
+    k = np.arange(2*len(n) + 1, dtype=float)
+    sum2 = np.concatenate([[0], np.cumsum(k**2)])
+    sum4 = np.concatenate([[0], np.cumsum(k**4)])
+    m = n[:, np.newaxis]
+    w = n[np.newaxis, 1:]
+    wc = 2*w/(2*m + 1.)
+    # Sums over the center lobe -m..m
+    c2 = 2*sum2[m+1]
+    c4 = 2*sum4[m+1]
+    num = 2*(sum4[m+w+1] - sum4[m+1]) - wc*c4
+    den = 2*(sum2[m+w+1] - sum2[m+1]) - wc*c2
+    m, w = np.unravel_index(np.argmin(np.abs(num/den - 6*scale**2)),
+                            num.shape)
+    return r, a, int(m), int(w) + 1
+
+
+def integral_image(img, pad=0):
+    '''Integral image of img summed over its last two axes.
+
+    img is padded by pad pixels by reflection (scipy.ndimage mode
+    'reflect'). The result has one more row and column than the padded image
+    such that S[i, j] is the sum of the padded image above and left of
+    (i, j).
+    '''
+    img = np.asarray(img, dtype=float)
+    pad_width = [(0, 0)]*(img.ndim-2) + [(pad, pad)]*2
+    padded = np.pad(img, pad_width, mode='symmetric')
+    S = np.zeros(padded.shape[:-2] + (padded.shape[-2]+1,
+                                      padded.shape[-1]+1))
+    np.cumsum(padded, axis=-2, out=S[..., 1:, 1:])
+    np.cumsum(S[..., 1:, 1:], axis=-1, out=S[..., 1:, 1:])
+    return S
+
+
+def box_derivatives(img, scale, orders, outputs=None):
+    '''Approximate Gaussian derivatives with box filters.
+
+    All derivatives are computed from a single integral image with box
+    stencils sized by scale (similar to SURF), at constant cost per pixel
+    regardless of scale. The stencils reproduce the derivatives of
+    polynomials up to their order exactly and match the Gaussian derivatives
+    in variance. Relative RMS errors w.r.t. gaussian_filter() on natural
+    images are roughly 1-3% for order (0, 0), 5-18% for first order, 9-22%
+    for (2, 0) and (0, 2) and 10-23% for (1, 1), for scales 1 to 16. The
+    errors are largest at fine scales where the stencils are only a few
+    pixels wide and concentrated at high image frequencies.
+
+    Parameters
+    ----------
+    img: (..., h, w) array
+        Input image or stack of images.
+    scale: float
+        Standard deviation of the approximated Gaussian.
+    orders: list of (dy, dx) tuples
+        Derivative orders, at most 2 in total.
+    outputs: list of arrays
+        Optional output arrays, one per order.
+
+    Returns
+    -------
+    derivs: list of arrays
+        The derivatives in the order of orders.
+    '''
+    r, a, m, w = _box_sizes(scale)
+    pad = max(r, a, m+w) + 1
+    S = integral_image(img, pad)
+    h, w_img = img.shape[-2:]
+
+    def corner(dy, dx):
+        return S[..., pad+dy:pad+dy+h, pad+dx:pad+dx+w_img]
+
+    def rect(y0, y1, x0, x1):
+        # Sum over the rectangle [y0, y1] x [x0, x1] around every pixel
+        return (corner(y1+1, x1+1) - corner(y0, x1+1) - corner(y1+1, x0)
+                + corner(y0, x0))
+
+    box = 2*r + 1
+    wc = 2*w/(2*m + 1.)
+    k = np.arange(m+1, m+w+1)
+    c = np.arange(-m, m+1)
+    norm2 = box*(np.sum(k**2) - wc/2*np.sum(c**2))
+    if outputs is None:
+        outputs = [None]*len(orders)
+    derivs = []
+    for order, out in zip(orders, outputs):
+        order = tuple(order)
+        if order == (0, 0):
+            d = rect(-r, r, -r, r)/box**2
+        elif order == (1, 0):
+            d = (rect(1, a, -r, r) - rect(-a, -1, -r, r))/(box*a*(a+1))
+        elif order == (0, 1):
+            d = (rect(-r, r, 1, a) - rect(-r, r, -a, -1))/(box*a*(a+1))
+        elif order == (2, 0):
+            d = (rect(m+1, m+w, -r, r) + rect(-m-w, -m-1, -r, r)
+                 - wc*rect(-m, m, -r, r))/norm2
+        elif order == (0, 2):
+            d = (rect(-r, r, m+1, m+w) + rect(-r, r, -m-w, -m-1)
+                 - wc*rect(-r, r, -m, m))/norm2
+        elif order == (1, 1):
+            d = (rect(1, a, 1, a) + rect(-a, -1, -a, -1)
+                 - rect(1, a, -a, -1) - rect(-a, -1, 1, a))/(a*(a+1))**2
+        else:
+            raise ValueError('Invalid derivative order %s.' % (order,))
+        if out is None:
+            out = d
+        else:
+            out[...] = d
+        derivs.append(out)
+    return derivs
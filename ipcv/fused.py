@@ -0,0 +1,255 @@
+''' Fused per-pixel kernels for the shape index and BIF response algebra.
+
+After filtering, shape_index() and bif_response() combine the image
+derivatives through a long sequence of elementwise operations. Done on whole
+images, every operation is a pass over memory. The kernels below compute all
+outputs of a pixel at once:
+
+- 'numba': compiled loops over the pixels (requires Numba). The kernels are
+  compiled on first use and cached on disk.
+- 'numpy': the NumPy operations are applied block by block such that the
+  temporaries stay in cache. The results are identical to the unblocked
+  operations.
+
+The default backend 'auto' uses Numba when it is installed.
+'''
+import threading
+import numpy as np
+
+
+_BACKENDS = ['auto', 'numba', 'numpy']
+_backend = 'auto'
+_numba_kernels = None
+_local = threading.local()
+
+# Number of pixels processed at a time by the NumPy backend
+BLOCK_SIZE = 8192
+
+
+def set_backend(backend):
+    ''' Select the kernel backend: 'auto', 'numba' or 'numpy'. '''
+    global _backend
+    if backend not in _BACKENDS:
+        raise ValueError('Invalid backend %s.' % backend)
+    if backend == 'numba' and _get_numba_kernels() is None:
+        raise ValueError('Numba is not available.')
+    _backend = backend
+
+
+def get_backend():
+    ''' Return the backend in use, 'numba' or 'numpy'. '''
+    if _backend == 'auto':
+        return 'numpy' if _get_numba_kernels() is None else 'numba'
+    return _backend
+
+
+def _get_numba_kernels():
+    global _numba_kernels
+    if _numba_kernels is None:
+        try:
+            import numba
+        except ImportError:
+            _numba_kernels = False
+        else:
+            _numba_kernels = _compile_numba_kernels(numba)
+    return _numba_kernels or None
+
+
+def _compile_numba_kernels(numba):
+    # The constants are passed in the dtype of the arrays such that float32
+    # arrays are computed in float32 as with the NumPy backend.
+    @numba.njit(cache=True, nogil=True)
+    def shape_index(Lyy, Lxy, Lxx, si, si_c, si_o, si_om, orientations,
+                    eps, half, two, four):
+        for i in range(Lxx.shape[0]):
+            xx = Lxx[i]
+            xy = Lxy[i]
+            yy = Lyy[i]
+            # The arctans are taken afterwards by NumPy, whose vectorized
+            # implementation is considerably faster than the scalar one.
+            si[i] = -(xx + yy)/(np.sqrt((xx - yy)*(xx - yy) + four*(xy*xy))
+                                + eps)
+            si_c[i] = half*np.sqrt(xx*xx + two*(xy*xy) + yy*yy)
+            if orientations:
+                t = xx + yy
+                d = xx*yy - xy*xy
+                r = np.sqrt(np.abs(t*t/four - d))
+                l1 = t/two + r
+                l2 = t/two - r
+                si_o[i] = (l1 - yy)/(xy + eps)
+                si_om[i] = l1 - l2
+
+    @numba.njit(cache=True, nogil=True)
+    def bif_response(Ly, Lx, Lyy, Lxy, Lxx, L, eps, bif_r, c, two, four):
+        for i in range(Lxx.shape[0]):
+            lambd = Lyy[i] + Lxx[i]
+            gamma = np.sqrt((Lyy[i] - Lxx[i])*(Lyy[i] - Lxx[i])
+                            + four*(Lxy[i]*Lxy[i]))
+            bif_r[i, 0] = two*np.sqrt(Ly[i]*Ly[i] + Lx[i]*Lx[i])
+            bif_r[i, 1] = lambd
+            bif_r[i, 2] = -lambd
+            bif_r[i, 3] = c*(gamma + lambd)
+            bif_r[i, 4] = c*(gamma - lambd)
+            bif_r[i, 5] = gamma
+            if bif_r.shape[1] > 6:
+                bif_r[i, 6] = eps*L[i]
+
+    return {'shape_index': shape_index, 'bif_response': bif_response}
+
+
+def _flat(a):
+    ''' Flat view of a contiguous array. '''
+    if not a.flags.c_contiguous:
+        raise ValueError('Fused kernels require contiguous arrays.')
+    return a.reshape(-1)
+
+
+def _scratch(n, dtype):
+    ''' Return n block sized scratch arrays, reused across calls within a
+    thread. '''
+    key = np.dtype(dtype).str
+    arrs = getattr(_local, key, None)
+    if arrs is None:
+        arrs = [np.empty(BLOCK_SIZE, dtype=dtype) for _ in range(3)]
+        setattr(_local, key, arrs)
+    return arrs[:n]
+
+
+def _blocks(n):
+    for start in range(0, n, BLOCK_SIZE):
+        yield slice(start, min(start + BLOCK_SIZE, n))
+
+
+def shape_index(Lyy, Lxy, Lxx, si, si_c, si_o=None, si_om=None):
+    '''Compute the shape index from scale normalized second derivatives.
+
+    The outputs si and si_c (and the orientations si_o and si_om if given)
+    are written in place. All arrays must be contiguous and of the same
+    shape.
+    '''
+    orientations = si_o is not None
+    Lyy, Lxy, Lxx, si, si_c = [_flat(a) for a in (Lyy, Lxy, Lxx, si, si_c)]
+    if orientations:
+        si_o, si_om = _flat(si_o), _flat(si_om)
+    if get_backend() == 'numba':
+        if not orientations:
+            si_o, si_om = si, si_c
+        f = si.dtype.type
+        _get_numba_kernels()['shape_index'](Lyy, Lxy, Lxx, si, si_c, si_o,
+                                            si_om, orientations, f(1e-10),
+                                            f(.5), f(2), f(4))
+        np.arctan(si, out=si)
+        if orientations:
+            np.arctan(si_o, out=si_o)
+        return
+    tmp, tmp2, t = _scratch(3, si.dtype)
+    for b in _blocks(len(Lxx)):
+        _shape_index_numpy(Lyy[b], Lxy[b], Lxx[b], si[b], si_c[b],
+                           None if si_o is None else si_o[b],
+                           None if si_om is None else si_om[b],
+                           tmp[:b.stop-b.start], tmp2[:b.stop-b.start],
+                           t[:b.stop-b.start])
+
+
+def _shape_index_numpy(Lyy, Lxy, Lxx, si, si_c, si_o, si_om, tmp, tmp2, t):
+    # si = arctan((-Lxx-Lyy) / (sqrt((Lxx - Lyy)**2 + 4*Lxy**2) + 1e-10))
+    np.subtract(Lxx, Lyy, out=tmp)
+    tmp **= 2
+    np.square(Lxy, out=tmp2)
+    tmp2 *= 4
+    tmp += tmp2
+    np.sqrt(tmp, out=tmp)
+    tmp += 1e-10
+    np.add(Lxx, Lyy, out=si)
+    np.negative(si, out=si)
+    si /= tmp
+    np.arctan(si, out=si)
+
+    # si_c = .5*sqrt(Lxx**2 + 2*Lxy**2 + Lyy**2)
+    np.square(Lxx, out=si_c)
+    np.square(Lxy, out=tmp)
+    tmp *= 2
+    si_c += tmp
+    np.square(Lyy, out=tmp)
+    si_c += tmp
+    np.sqrt(si_c, out=si_c)
+    si_c *= .5
+
+    if si_o is not None:
+        # Eigenvalues l1, l2 = t/2 +- sqrt(|t**2/4 - d|) of the Hessian
+        d = tmp2
+        np.add(Lxx, Lyy, out=t)
+        np.multiply(Lxx, Lyy, out=d)
+        np.square(Lxy, out=tmp)
+        d -= tmp
+        np.square(t, out=tmp)
+        tmp /= 4
+        tmp -= d
+        np.abs(tmp, out=tmp)
+        np.sqrt(tmp, out=tmp)
+        t /= 2.0
+        l1 = si_o
+        l2 = d
+        np.add(t, tmp, out=l1)
+        np.subtract(t, tmp, out=l2)
+        np.subtract(l1, l2, out=si_om)
+        # si_o = arctan((l1 - Lyy)/(Lxy + 1e-10))
+        l1 -= Lyy
+        np.add(Lxy, 1e-10, out=tmp)
+        si_o /= tmp
+        np.arctan(si_o, out=si_o)
+
+
+def bif_response(Ly, Lx, Lyy, Lxy, Lxx, L, eps, bif_r):
+    '''Compute the BIF responses from scale normalized derivatives.
+
+    bif_r is a contiguous (..., 6) or (..., 7) array written in place. The
+    seventh (flat) response eps*L is only computed for 7 responses, L may be
+    None otherwise.
+    '''
+    n_responses = bif_r.shape[-1]
+    Ly, Lx, Lyy, Lxy, Lxx = [_flat(a) for a in (Ly, Lx, Lyy, Lxy, Lxx)]
+    if L is None:
+        L = Lxx
+    L = _flat(L)
+    bif_r = _flat(bif_r).reshape(-1, n_responses)
+    if get_backend() == 'numba':
+        f = bif_r.dtype.type
+        _get_numba_kernels()['bif_response'](Ly, Lx, Lyy, Lxy, Lxx, L,
+                                             f(eps), bif_r, f(2**(-.5)),
+                                             f(2), f(4))
+        return
+    lambd, gamma, tmp = _scratch(3, bif_r.dtype)
+    for b in _blocks(len(Lxx)):
+        m = b.stop - b.start
+        _bif_response_numpy(Ly[b], Lx[b], Lyy[b], Lxy[b], Lxx[b], L[b], eps,
+                            bif_r[b], lambd[:m], gamma[:m], tmp[:m])
+
+
+def _bif_response_numpy(Ly, Lx, Lyy, Lxy, Lxx, L, eps, bif_r, lambd, gamma,
+                        tmp):
+    if bif_r.shape[-1] > 6:
+        np.multiply(L, eps, out=bif_r[..., 6])
+
+    # lambd = Lyy + Lxx, gamma = sqrt((Lyy-Lxx)**2 + 4*Lxy**2)
+    np.add(Lyy, Lxx, out=lambd)
+    np.subtract(Lyy, Lxx, out=gamma)
+    gamma **= 2
+    np.square(Lxy, out=tmp)
+    tmp *= 4
+    gamma += tmp
+    np.sqrt(gamma, out=gamma)
+
+    # 2*sqrt(Ly**2 + Lx**2)
+    np.square(Ly, out=tmp)
+    np.square(Lx, out=bif_r[..., 0])
+    tmp += bif_r[..., 0]
+    np.sqrt(tmp, out=tmp)
+    np.multiply(tmp, 2, out=bif_r[..., 0])
+    bif_r[..., 1] = lambd
+    np.negative(lambd, out=bif_r[..., 2])
+    np.add(gamma, lambd, out=tmp)
+    np.multiply(tmp, 2**(-.5), out=bif_r[..., 3])
+    np.subtract(gamma, lambd, out=tmp)
+    np.multiply(tmp, 2**(-.5), out=bif_r[..., 4])
+    bif_r[..., 5] = gamma
@@ -1,6 +1,8 @@
+from math import factorial
 import numpy as np
-from scipy.misc import factorial
 
+from .filtering import gaussian_filter
+from .misc import normalize
 from .scalespace import ScaleSpace
 from .util import extract_keypoint
 
@@ -8,14 +10,15 @@ from .util import extract_keypoint
 class JetDescriptor:
     def __init__(self, k=4, sigma=5.3, rings=1, ring_samplings=4,
                  normalization='l2', whitening=True, patch_size=64,
-                 keypoint_scale=3):
-
+                 keypoint_scale=3, compressor=None):
         self.whitening = whitening
         self.keypoint_scale = keypoint_scale
         self.normalization = normalization
+        self.compressor = compressor
         self.jet_dim = self.jet_dimensionality(k)-1
         self.desc_dim = (rings * ring_samplings + 1) * self.jet_dim
         self.patch_shape = (patch_size, patch_size)
+        self.sigma = sigma
 
         # Generate Fourier filters
         dys = []
@@ -26,11 +29,14 @@ class JetDescriptor:
                 dys.append(i)
                 dxs.append(order-i)
                 self.orders.append(order)
+        self.dys = dys
+        self.dxs = dxs
         self.sigmas = [sigma] * self.jet_dim
         self.scalespace = ScaleSpace(self.patch_shape, self.sigmas, dys, dxs)
 
         # Calculate sampling points
         center = float(patch_size)/2
+        self.center = center
         self.x_coords = [int(round(center))]
         self.y_coords = [int(round(center))]
         for r in range(rings):
@@ -51,18 +57,19 @@ class JetDescriptor:
                         order = float(m+n)
                         covar[i, j] = (-1.0)**(order / 2 + (dys[j]+dxs[j])) \
                             * factorial(n) * factorial(m) / (2*np.pi
-                            * 2**order*order*factorial(n/2)*factorial(m/2))
+                            * 2**order*order*factorial(n//2)*factorial(m//2))
             V, D, _ = np.linalg.svd(covar)
             self.whitener = np.dot(V, np.diag(D**(-.5)))
 
     def jet_dimensionality(self, k):
-        return int(factorial(2+k)/(2*factorial(k)))
+        return factorial(2+k)//(2*factorial(k))
 
     def compute(self, img, keypoints):
         descs = np.empty((len(keypoints), len(self.y_coords), self.jet_dim))
         patch_jet = np.empty((self.jet_dim,) + self.patch_shape)
 
         for k, keypoint in enumerate(list(keypoints)):
+            keypoint = np.array(keypoint[:5], dtype=float)
             keypoint[:2] = keypoint[:2]-1
             patch = extract_keypoint(img, keypoint, self.patch_shape,
                                      self.keypoint_scale)
@@ -75,16 +82,99 @@ class JetDescriptor:
             X = patch_jet[:, self.x_coords, self.y_coords]
             descs[k, :, :] = X.T
 
+        return self._postprocess(descs)
+
+    def compute_dense(self, img, step, radius=1.0, fft=False):
+        '''Compute descriptors on a regular grid of isotropic keypoints.
+
+        Instead of resampling and filtering a patch per keypoint, the k-jet is
+        computed once over the whole image at the scale corresponding to the
+        keypoint radius. The descriptors are then gathered from the jet images
+        at the ring offsets of every grid point.
+
+        Parameters
+        ----------
+        img: (h, w) array
+            Input image.
+        step: int
+            Grid spacing in pixels.
+        radius: float
+            Radius of the isotropic grid keypoints, i.e. a = c = 1/radius**2.
+        fft: bool
+            Compute the jet in the Fourier domain instead of by spatial
+            filtering.
+
+        Returns
+        -------
+        keypoints: (n_points, 5) array
+            Grid keypoints in the layout returned by read_keypoints().
+        descs: (n_points, desc_dim) array
+            Descriptors of the grid keypoints.
+        '''
+
+        # Size of a patch pixel in image pixels
+        patch_scale = radius * self.keypoint_scale * 2 / self.patch_shape[0]
+        scale = self.sigma * patch_scale
+
+        # Compute image jets
+        if fft:
+            ss = ScaleSpace(img.shape, [scale]*self.jet_dim, self.dys,
+                            self.dxs)
+            derivs = ss.compute(img)
+        else:
+            derivs = [gaussian_filter(img, scale, order=(dy, dx),
+                                      mode='reflect')
+                      for dy, dx in zip(self.dys, self.dxs)]
+        jet = np.empty((self.jet_dim,) + img.shape)
+        for i in range(len(derivs)):
+            jet[i, :, :] = scale**self.orders[i]*derivs[i]
+
+        # Sampling offsets in image coordinates. As in compute() the patch
+        # rows are sampled with x_coords and the patch columns with y_coords.
+        y_offsets = np.round((np.array(self.x_coords) - self.center)
+                             * patch_scale).astype(int)
+        x_offsets = np.round((np.array(self.y_coords) - self.center)
+                             * patch_scale).astype(int)
+
+        # Grid points whose samples all lie within the image
+        margin = max(np.max(np.abs(y_offsets)), np.max(np.abs(x_offsets)))
+        h, w = img.shape
+        ys = np.arange(margin, h-margin, step)
+        xs = np.arange(margin, w-margin, step)
+        yv, xv = np.meshgrid(ys, xs, indexing='ij')
+        yv = np.ravel(yv)
+        xv = np.ravel(xv)
+
+        # Extract jet samples
+        rows = yv[:, np.newaxis] + y_offsets[np.newaxis, :]
+        cols = xv[:, np.newaxis] + x_offsets[np.newaxis, :]
+        descs = np.transpose(jet[:, rows, cols], (1, 2, 0))
+
+        keypoints = np.empty((len(yv), 5))
+        keypoints[:, 0] = xv + 1
+        keypoints[:, 1] = yv + 1
+        keypoints[:, 2] = 1.0/radius**2
+        keypoints[:, 3] = 0.0
+        keypoints[:, 4] = 1.0/radius**2
+        return keypoints, self._postprocess(descs)
+
+    def _postprocess(self, descs):
+        '''Whiten, normalize and optionally compress a (n_points, n_samples,
+        jet_dim) array of jet samples.'''
+        n_points = descs.shape[0]
+
         # Whitening
-        descs = np.dot(descs, self.whitener)
-        descs = np.reshape(descs, (len(keypoints), self.desc_dim))
+        if self.whitening:
+            descs = np.dot(descs, self.whitener)
+        descs = np.reshape(descs, (n_points, self.desc_dim))
 
         # Normalize descriptors.
         if self.normalization != 'off':
             descs += 1e-10
-            if self.normalization == 'l1':
-                descs /= np.sum(descs, axis=1)[:, np.newaxis]
-            elif self.normalization == 'l2':
-                descs /= np.sqrt(np.sum(descs ** 2, axis=1))[:, np.newaxis]
+            normalize(descs, self.normalization, axis=1, out=descs)
+
+        # Compress descriptors, see quantization.DescriptorCompressor.
+        if self.compressor is not None:
+            descs = self.compressor.encode(descs)
 
         return descs
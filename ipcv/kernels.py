@@ -0,0 +1,127 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _chi2_block(x, y, out):
+    # sum_k 2 x_k y_k / (x_k + y_k)
+    num = x*y
+    den = x+y
+    den[den == 0] = 1
+    num /= den
+    out += 2*np.sum(num, axis=2)
+
+
+def _intersection_block(x, y, out):
+    out += np.sum(np.minimum(x, y), axis=2)
+
+
+def _gram(X, Y, block_fun, block_size, feature_block_size, n_threads,
+          dtype):
+    ''' Evaluate an additive kernel between the rows of X and Y in blocks.
+
+    The Gram matrix is split in block_size x block_size tiles. Within a tile
+    the features are processed feature_block_size at a time such that the
+    broadcasted temporaries stay cache sized.
+    '''
+    symmetric = Y is None
+    X = np.reshape(np.asarray(X, dtype=dtype), (len(X), -1))
+    Y = X if symmetric else np.reshape(np.asarray(Y, dtype=dtype),
+                                       (len(Y), -1))
+    if X.shape[1] != Y.shape[1]:
+        raise ValueError('X and Y must have the same number of features.')
+    K = np.empty((X.shape[0], Y.shape[0]), dtype=dtype)
+    n_features = X.shape[1]
+
+    def compute_tile(tile):
+        rows, cols = tile
+        out = np.zeros((rows.stop-rows.start, cols.stop-cols.start),
+                       dtype=dtype)
+        for start in range(0, n_features, feature_block_size):
+            feats = slice(start, start+feature_block_size)
+            x = X[rows, np.newaxis, feats]
+            y = Y[np.newaxis, cols, feats]
+            block_fun(x, y, out)
+        K[rows, cols] = out
+        if symmetric and rows != cols:
+            K[cols, rows] = out.T
+
+    row_blocks = [slice(i, min(i+block_size, X.shape[0]))
+                  for i in range(0, X.shape[0], block_size)]
+    col_blocks = [slice(j, min(j+block_size, Y.shape[0]))
+                  for j in range(0, Y.shape[0], block_size)]
+    if symmetric:
+        # Only compute the upper triangle of tiles
+        tiles = [(r, c) for i, r in enumerate(row_blocks)
+                 for c in col_blocks[i:]]
+    else:
+        tiles = [(r, c) for r in row_blocks for c in col_blocks]
+    if n_threads > 1:
+        with ThreadPoolExecutor(n_threads) as executor:
+            list(executor.map(compute_tile, tiles))
+    else:
+        for tile in tiles:
+            compute_tile(tile)
+    return K
+
+
+def chi2_kernel(X, Y=None, gamma=None, block_size=128, feature_block_size=16,
+                n_threads=1, dtype=np.float32):
+    ''' Chi-squared kernel between histograms.
+
+    Parameters
+    ----------
+    X: (n, ...) array
+        Histograms, e.g. stacked outputs of go_hist() or bif_hist(). Each
+        histogram is flattened.
+    Y: (m, ...) array
+        Second set of histograms. If None, the symmetric Gram matrix of X is
+        computed, evaluating only its upper triangle.
+    gamma: float
+        If None the additive chi-squared kernel sum(2*x*y/(x+y)) is returned.
+        Otherwise the exponential chi-squared kernel
+        exp(-gamma*sum((x-y)**2/(x+y))).
+    block_size: int
+        Gram matrix tile size.
+    feature_block_size: int
+        Number of features processed at a time within a tile.
+    n_threads: int
+        Number of threads processing tiles in parallel.
+    dtype: dtype
+        Accumulation and output dtype.
+
+    Returns
+    -------
+    K: (n, m) array
+        Gram matrix.
+    '''
+    K = _gram(X, Y, _chi2_block, block_size, feature_block_size, n_threads,
+              dtype)
+    if gamma is not None:
+        # sum((x-y)**2/(x+y)) = sum(x) + sum(y) - 2*sum(2*x*y/(x+y))
+        X = np.reshape(np.asarray(X, dtype=dtype), (len(X), -1))
+        Y = X if Y is None else np.reshape(np.asarray(Y, dtype=dtype),
+                                           (len(Y), -1))
+        K = np.sum(X, axis=1)[:, np.newaxis] + np.sum(Y, axis=1) - 2*K
+        np.maximum(K, 0, out=K)
+        K *= -gamma
+        np.exp(K, out=K)
+    return K
+
+
+def intersection_kernel(X, Y=None, block_size=128, feature_block_size=16,
+                        n_threads=1, dtype=np.float32):
+    ''' Histogram intersection kernel sum(min(x, y)) between histograms.
+    Parameters are as for chi2_kernel(). '''
+    return _gram(X, Y, _intersection_block, block_size, feature_block_size,
+                 n_threads, dtype)
+
+
+def hellinger_kernel(X, Y=None, dtype=np.float32):
+    ''' Hellinger kernel sum(sqrt(x*y)) between histograms. The kernel is a
+    single matrix product of the square rooted histograms. '''
+    X = np.sqrt(np.reshape(np.asarray(X, dtype=dtype), (len(X), -1)))
+    if Y is None:
+        Y = X
+    else:
+        Y = np.sqrt(np.reshape(np.asarray(Y, dtype=dtype), (len(Y), -1)))
+    return np.dot(X, Y.T)
@@ -0,0 +1,187 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _prepare(descs1, descs2, metric):
+    dtype = np.result_type(descs1.dtype, descs2.dtype, np.float32)
+    descs1 = np.asarray(descs1, dtype=dtype)
+    descs2 = np.asarray(descs2, dtype=dtype)
+    if metric == 'l2':
+        norms1 = np.sum(descs1**2, axis=1)
+        norms2 = np.sum(descs2**2, axis=1)
+    elif metric == 'cosine':
+        descs1 = descs1 / (np.sqrt(np.sum(descs1**2, axis=1))[:, np.newaxis]
+                           + 1e-12)
+        descs2 = descs2 / (np.sqrt(np.sum(descs2**2, axis=1))[:, np.newaxis]
+                           + 1e-12)
+        norms1 = norms2 = None
+    else:
+        raise ValueError('Invalid metric.')
+    return descs1, descs2, norms1, norms2
+
+
+def _distance_tile(a, b, norms_a, norms_b, metric):
+    ''' Squared L2 or cosine distances between the rows of a and b. '''
+    d = np.dot(a, b.T)
+    if metric == 'l2':
+        d *= -2
+        d += norms_a[:, np.newaxis]
+        d += norms_b[np.newaxis, :]
+        np.maximum(d, 0, out=d)
+    else:
+        np.subtract(1, d, out=d)
+    return d
+
+
+def _smallest(dists, idxs, k):
+    ''' Select the k smallest entries of each row. '''
+    if dists.shape[1] > k:
+        part = np.argpartition(dists, k-1, axis=1)[:, :k]
+        dists = np.take_along_axis(dists, part, axis=1)
+        idxs = np.take_along_axis(idxs, part, axis=1)
+    return dists, idxs
+
+
+def _match_block(descs1, descs2, norms1, norms2, rows, k, metric,
+                 block_size):
+    ''' Find the k nearest neighbours of descs1[rows] in descs2 and the
+    nearest neighbour of every row of descs2 in descs1[rows]. '''
+    a = descs1[rows]
+    norms_a = None if norms1 is None else norms1[rows]
+    n2 = descs2.shape[0]
+    best_dists = np.empty((len(a), 0), dtype=a.dtype)
+    best_idxs = np.empty((len(a), 0), dtype=int)
+    col_dists = np.empty(n2, dtype=a.dtype)
+    col_idxs = np.empty(n2, dtype=int)
+    for start in range(0, n2, block_size):
+        cols = slice(start, min(start+block_size, n2))
+        norms_b = None if norms2 is None else norms2[cols]
+        d = _distance_tile(a, descs2[cols], norms_a, norms_b, metric)
+        # Column-wise nearest neighbours for the mutual consistency check
+        col_argmin = np.argmin(d, axis=0)
+        col_dists[cols] = d[col_argmin, np.arange(d.shape[1])]
+        col_idxs[cols] = col_argmin + rows.start
+        # Row-wise k nearest neighbours
+        tile_idxs = np.broadcast_to(np.arange(cols.start, cols.stop),
+                                    d.shape)
+        d, tile_idxs = _smallest(d, tile_idxs, k)
+        best_dists = np.concatenate((best_dists, d), axis=1)
+        best_idxs = np.concatenate((best_idxs, tile_idxs), axis=1)
+        best_dists, best_idxs = _smallest(best_dists, best_idxs, k)
+    return best_dists, best_idxs, col_dists, col_idxs
+
+
+def _search(descs1, descs2, k, metric, block_size, n_threads):
+    descs1, descs2, norms1, norms2 = _prepare(descs1, descs2, metric)
+    n1 = descs1.shape[0]
+    row_blocks = [slice(start, min(start+block_size, n1))
+                  for start in range(0, n1, block_size)]
+
+    def match_block(rows):
+        return _match_block(descs1, descs2, norms1, norms2, rows, k, metric,
+                            block_size)
+    if n_threads > 1:
+        with ThreadPoolExecutor(n_threads) as executor:
+            results = list(executor.map(match_block, row_blocks))
+    else:
+        results = [match_block(rows) for rows in row_blocks]
+
+    k = min(k, descs2.shape[0])
+    dists = np.empty((n1, k), dtype=descs1.dtype)
+    idxs = np.empty((n1, k), dtype=int)
+    col_dists = np.full(descs2.shape[0], np.inf, dtype=descs1.dtype)
+    col_idxs = np.zeros(descs2.shape[0], dtype=int)
+    for rows, (d, i, c_d, c_i) in zip(row_blocks, results):
+        order = np.argsort(d, axis=1)
+        dists[rows] = np.take_along_axis(d, order, axis=1)
+        idxs[rows] = np.take_along_axis(i, order, axis=1)
+        better = c_d < col_dists
+        col_dists[better] = c_d[better]
+        col_idxs[better] = c_i[better]
+    if metric == 'l2':
+        np.sqrt(dists, out=dists)
+    return dists, idxs, col_idxs
+
+
+def nearest_neighbors(descs1, descs2, k=1, metric='l2', block_size=1024,
+                      n_threads=1):
+    ''' Exact k-nearest neighbour search.
+
+    Distances are computed with matrix products in tiles of at most
+    block_size x block_size descriptors to bound memory use.
+
+    Parameters
+    ----------
+    descs1: (n1, d) array
+        Query descriptors.
+    descs2: (n2, d) array
+        Database descriptors.
+    k: int
+        Number of neighbours.
+    metric: str
+        'l2' for Euclidean distance or 'cosine' for cosine distance.
+    block_size: int
+        Tile size.
+    n_threads: int
+        Number of threads processing tiles in parallel.
+
+    Returns
+    -------
+    dists: (n1, min(k, n2)) array
+        Distances to the nearest neighbours in ascending order.
+    idxs: (n1, min(k, n2)) array
+        Row indices of the nearest neighbours in descs2.
+    '''
+    dists, idxs, _ = _search(descs1, descs2, k, metric, block_size, n_threads)
+    return dists, idxs
+
+
+def match_descriptors(descs1, descs2, metric='l2', ratio=None, mutual=False,
+                      block_size=1024, n_threads=1):
+    ''' Match two sets of descriptors, e.g. from JetDescriptor.compute().
+
+    Parameters
+    ----------
+    descs1: (n1, d) array
+        First descriptor set.
+    descs2: (n2, d) array
+        Second descriptor set.
+    metric: str
+        'l2' for Euclidean distance or 'cosine' for cosine distance.
+    ratio: float
+        If given, only keep matches whose distance is below ratio times the
+        distance to the second nearest neighbour (Lowe's ratio test). If
+        descs2 holds a single descriptor no match passes the test.
+    mutual: bool
+        Only keep matches that are also nearest neighbours in the opposite
+        direction.
+    block_size: int
+        Tile size.
+    n_threads: int
+        Number of threads processing tiles in parallel.
+
+    Returns
+    -------
+    matches: (n_matches, 2) array
+        Row indices (i, j) into descs1 and descs2. keypoints1[matches[:, 0]]
+        and keypoints2[matches[:, 1]] give the matched keypoints.
+    dists: (n_matches,) array
+        Match distances.
+    '''
+    k = 1 if ratio is None else 2
+    dists, idxs, col_idxs = _search(descs1, descs2, k, metric, block_size,
+                                    n_threads)
+    if dists.shape[1] == 0:
+        # descs2 is empty
+        return np.empty((0, 2), dtype=int), np.empty(0, dtype=dists.dtype)
+    keep = np.ones(len(dists), dtype=bool)
+    if ratio is not None:
+        if dists.shape[1] > 1:
+            keep &= dists[:, 0] < ratio*dists[:, 1]
+        else:
+            # Without a second nearest neighbour the test cannot pass
+            keep[:] = False
+    if mutual:
+        keep &= col_idxs[idxs[:, 0]] == np.arange(len(idxs))
+    matches = np.column_stack((np.flatnonzero(keep), idxs[keep, 0]))
+    return matches, dists[keep, 0]
@@ -1,9 +1,11 @@
 from .donuts import donut, donuts
 from .isophotes import isophotes
 from .normalization import normalize
+from .workspace import Workspace
 
 
 __all__ = ['donut',
            'donuts',
            'isophotes',
-           'normalize']
+           'normalize',
+           'Workspace']
@@ -1,7 +1,9 @@
 import numpy as np
 
+from ..profiling import stage
 
-def isophotes(img, n, limits, scale, smoothing_fun='gaussian'):
+
+def isophotes(img, n, limits, scale, smoothing_fun='gaussian', out=None):
     """Generate soft isophote images.
 
     Generate n soft isophote images with equally spaced isophote lines between
@@ -18,25 +20,37 @@ def isophotes(img, n, limits, scale, smoothing_fun='gaussian'):
         smoothing_fun: 'gaussian' selects Gaussian smoothing. 'von_mises'
             selects the Von Mises distribution (aka. circular normal
             distribution). Von mises is useful for image intensities of
-            periodic nature.
+            periodic nature. Note that img is rescaled in place.
+        out: Optional (n, p, q) output array.
 
     Returns:
         Isophote images of img stored in a (n, p, q) array.
     """
-    iso = np.empty((n,) + img.shape)
-    limit_size = limits[1]-limits[0]
-    if smoothing_fun == 'gaussian':
-        step = limit_size/float(n)
-        centers = np.linspace(limits[0]+step*.5, limits[1]-step*.5, n)
-        for i, c in enumerate(centers):
-            iso[i, :, :] = np.exp(-(img-c)**2/(2*scale**2))
-    elif smoothing_fun == 'von_mises':
-        img *= 2*np.pi/limit_size
-        step = 2*np.pi/float(n)
-        centers = np.linspace(-np.pi+step*.5, np.pi-step*.5, n)
-        kappa = 1/(scale**2)
-        for i, c in enumerate(centers):
-            iso[i, :, :] = np.exp(kappa * np.cos(img-c))
-    else:
-        raise ValueError('Invalid smoothing function.')
+    with stage('isophotes'):
+        if out is None:
+            out = np.empty((n,) + img.shape)
+        iso = out
+        limit_size = limits[1]-limits[0]
+        if smoothing_fun == 'gaussian':
+            step = limit_size/float(n)
+            centers = np.linspace(limits[0]+step*.5, limits[1]-step*.5, n)
+            for i, c in enumerate(centers):
+                # iso[i] = exp(-(img-c)**2/(2*scale**2))
+                np.subtract(img, c, out=iso[i])
+                iso[i] **= 2
+                iso[i] /= -2*scale**2
+                np.exp(iso[i], out=iso[i])
+        elif smoothing_fun == 'von_mises':
+            img *= 2*np.pi/limit_size
+            step = 2*np.pi/float(n)
+            centers = np.linspace(-np.pi+step*.5, np.pi-step*.5, n)
+            kappa = 1/(scale**2)
+            for i, c in enumerate(centers):
+                # iso[i] = exp(kappa * cos(img-c))
+                np.subtract(img, c, out=iso[i])
+                np.cos(iso[i], out=iso[i])
+                iso[i] *= kappa
+                np.exp(iso[i], out=iso[i])
+        else:
+            raise ValueError('Invalid smoothing function.')
     return iso
@@ -1,29 +1,68 @@
 import numpy as np
 
 
-def normalize(x, method):
+def normalize(x, method, axis=None, out=None, power=0.5, clip=0.2):
     '''Normalize vector
 
-    Normalize vector according to the specified method.
+    Normalize vector according to the specified method. The normalization is
+    applied to the whole array or independently along the given axes, e.g.
+    axis=1 normalizes every row of a (N, D) descriptor matrix in one call.
 
     Args:
         x: vector to be normalized.
         method: One of the following normalization methods:
-            ['l1', 'l1_root', 'l2', 'none'].
+            ['l1', 'l1_root', 'l2', 'power', 'clip', 'none'].
+            'l1_root' is the square root of the L1 normalized vector (aka.
+            Hellinger normalization). 'power' raises the absolute values to
+            the given power keeping their sign and L2 normalizes the result.
+            'clip' L2 normalizes, clips the values to [-clip, clip] and L2
+            normalizes again.
+        axis: None normalizes the whole array. Otherwise an int or a tuple
+            of ints specifying the axes along which to normalize.
+        out: Output array of the same shape as x. Pass x itself to normalize
+            in place.
+        power: Exponent for the 'power' method.
+        clip: Threshold for the 'clip' method.
 
     Returns:
-        Normalized vector with the same shape as x.
+        Normalized vector with the same shape as x. Floating point inputs
+        keep their dtype.
     '''
+    x = np.asarray(x)
+    if out is None:
+        if np.issubdtype(x.dtype, np.floating):
+            out = x.copy()
+        else:
+            out = x.astype(float)
+    elif out is not x:
+        out[...] = x
+
+    def l1(v):
+        v /= np.sum(v, axis=axis, keepdims=True)
+
+    def l2(v):
+        v /= np.sqrt(np.sum(v**2, axis=axis, keepdims=True))
+
     if method == 'l1_root':
-        x = x/np.sum(x)
-        x = np.sqrt(x)
-        x = x/np.sum(x)
+        l1(out)
+        np.sqrt(out, out=out)
+        l1(out)
     elif method == 'l1':
-        x = x/np.sum(x)
+        l1(out)
     elif method == 'l2':
-        x = x/np.sqrt(np.sum(x**2))
+        l2(out)
+    elif method == 'power':
+        sign = np.sign(out)
+        np.abs(out, out=out)
+        out **= power
+        out *= sign
+        l2(out)
+    elif method == 'clip':
+        l2(out)
+        np.clip(out, -clip, clip, out=out)
+        l2(out)
     elif method == 'none':
         pass
     else:
         raise ValueError('Invalid normalization method.')
-    return x
+    return out
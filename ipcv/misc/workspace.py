@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class Workspace:
+    def __init__(self, shape, dtype=np.float64):
+        ''' Scratch buffers for repeated calls on images of a fixed shape.
+
+        Functions accepting a workspace argument (gradient_orientation(),
+        shape_index(), bif_response() and the *_hist() functions) write their
+        intermediate and output arrays into named buffers of the workspace
+        instead of allocating them on every call. Buffers are allocated on
+        first use and reused afterwards. Arrays returned by these functions
+        are views of the workspace buffers and are overwritten by the next
+        call using the same workspace. A workspace must not be shared between
+        threads. The workspace also caches the Fourier domain filters used
+        with fft=True. E.g.
+
+            ws = Workspace(frame.shape)
+            for frame in frames:
+                hists = si_hist(frame, workspace=ws)
+        '''
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.buffers = {}
+        self.plans = {}
+
+    def get(self, name, shape=None, dtype=None):
+        ''' Return the uninitialized buffer name of the given shape and dtype
+        (defaulting to those of the workspace). '''
+        shape = self.shape if shape is None else tuple(shape)
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        buf = self.buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buf
+        return buf
+
+    def scalespace(self, sigma, orders):
+        ''' Return a cached ScaleSpace computing the derivatives of the given
+        (dy, dx) orders at scale sigma. '''
+        key = (sigma, tuple(orders))
+        ss = self.plans.get(key)
+        if ss is None:
+            from ..scalespace import ScaleSpace
+            ss = ScaleSpace(self.shape[-2:], [sigma]*len(orders),
+                            [dy for dy, _ in orders],
+                            [dx for _, dx in orders])
+            self.plans[key] = ss
+        return ss
+
+    def nbytes(self):
+        n_bytes = sum(buf.nbytes for buf in self.buffers.values())
+        for ss in self.plans.values():
+            n_bytes += sum(f.nbytes for f in ss.filters)
+        return n_bytes
+
+    def clear(self):
+        self.buffers.clear()
+        self.plans.clear()
+
+
+def get_workspace(workspace, img):
+    ''' Return workspace or a fresh Workspace for img if None. '''
+    if workspace is None:
+        dtype = img.dtype
+        if not np.issubdtype(dtype, np.floating):
+            dtype = np.float64
+        return Workspace(img.shape, dtype)
+    if workspace.shape != img.shape:
+        raise ValueError('Workspace shape %s does not match image shape %s.'
+                         % (workspace.shape, img.shape))
+    return workspace
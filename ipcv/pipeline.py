@@ -0,0 +1,167 @@
+import threading
+import numpy as np
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .jetdescriptor import JetDescriptor
+from .util import KeypointWriter, iter_keypoints
+
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def prefetch(iterable, n_prefetch=2):
+    ''' Iterate over iterable in a background thread.
+
+    At most n_prefetch items are produced ahead of the consumer such that I/O
+    in the producer overlaps with processing in the consumer while memory
+    stays bounded. Exceptions in the producer are re-raised in the consumer.
+    '''
+    q = queue.Queue(maxsize=n_prefetch)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                q.put(item)
+            q.put(_DONE)
+        except Exception as e:
+            q.put(_Failure(e))
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.exception
+            yield item
+    finally:
+        stop.set()
+        # Unblock the producer if it is waiting on a full queue.
+        while thread.is_alive():
+            try:
+                q.get(timeout=0.01)
+            except queue.Empty:
+                pass
+
+
+def iter_jet_descriptors(img, keypoint_chunks, descriptor=None):
+    ''' Compute jet descriptors chunk by chunk.
+
+    Parameters
+    ----------
+    img: (h, w) array
+        Input image.
+    keypoint_chunks: iterable of (n, 5+) arrays
+        Keypoint chunks, e.g. from util.iter_keypoints().
+    descriptor: JetDescriptor
+        Descriptor extractor. A default JetDescriptor is used if None.
+
+    Returns
+    -------
+    A generator yielding (keypoints, descs) pairs, one per chunk.
+    '''
+    if descriptor is None:
+        descriptor = JetDescriptor()
+    for keypoints in keypoint_chunks:
+        keypoints = np.asarray(keypoints)[:, :5]
+        yield keypoints, descriptor.compute(img, keypoints)
+
+
+def stream_jet_descriptors(img, keypoint_path, output, descriptor=None,
+                           chunk_size=10000, desc_dtype=None,
+                           n_prefetch=2):
+    ''' Extract jet descriptors for a keypoint file of arbitrary size.
+
+    Keypoints are read in chunks of chunk_size in a background thread while
+    descriptors are computed for the previous chunk. Finished chunks are
+    handed to another background thread that writes them to output such that
+    memory use is bounded by roughly (2*n_prefetch + 1) chunks.
+
+    Parameters
+    ----------
+    img: (h, w) array
+        Input image.
+    keypoint_path: str
+        Text or binary keypoint file.
+    output: str or object
+        Path of the binary keypoint file to write or an object with a
+        write(keypoints, descs) method, e.g. util.KeypointWriter.
+    descriptor: JetDescriptor
+        Descriptor extractor. A default JetDescriptor is used if None.
+    chunk_size: int
+        Number of keypoints processed at a time.
+    desc_dtype: dtype
+        Storage dtype of the descriptors when output is a path. Defaults to
+        the dtype of the computed descriptors.
+    n_prefetch: int
+        Number of chunks buffered by the reader and writer threads.
+
+    Returns
+    -------
+    n_keypoints: int
+        Number of keypoints processed.
+    '''
+    if descriptor is None:
+        descriptor = JetDescriptor()
+    writers = [] if isinstance(output, str) else [output]
+    q = queue.Queue(maxsize=n_prefetch)
+    failures = []
+
+    def consume():
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if not failures:
+                try:
+                    if not writers:
+                        # The descriptor shape and dtype depend on the
+                        # descriptor compression.
+                        descs = item[1]
+                        dtype = descs.dtype if desc_dtype is None \
+                            else desc_dtype
+                        writers.append(KeypointWriter(output, 5,
+                                                      descs.shape[1],
+                                                      desc_dtype=dtype))
+                    writers[0].write(*item)
+                except Exception as e:
+                    failures.append(e)
+
+    thread = threading.Thread(target=consume)
+    thread.daemon = True
+    thread.start()
+    n_keypoints = 0
+    try:
+        chunks = prefetch(iter_keypoints(keypoint_path, chunk_size),
+                          n_prefetch)
+        for keypoints, descs in iter_jet_descriptors(img, chunks, descriptor):
+            if failures:
+                break
+            q.put((keypoints, descs))
+            n_keypoints += len(keypoints)
+    finally:
+        q.put(_DONE)
+        thread.join()
+        if isinstance(output, str) and writers:
+            writers[0].close()
+    if failures:
+        raise failures[0]
+    if not writers:
+        # No keypoints, write an empty file.
+        KeypointWriter(output, 5, descriptor.desc_dim).close()
+    return n_keypoints
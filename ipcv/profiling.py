@@ -0,0 +1,192 @@
+''' Lightweight per-stage instrumentation.
+
+The expensive stages of ipcv (Gaussian filtering, Fourier domain scale-space,
+isophote generation, histogram reduction and keypoint patch resampling) are
+wrapped in named stages. When profiling is enabled, every stage records its
+number of calls, cumulative wall time and optionally the peak number of
+bytes allocated while it ran (measured with tracemalloc). When disabled a
+stage costs a global flag check. E.g.
+
+    from ipcv import profiling
+    with profiling.profile(memory=True) as prof:
+        ipcv.si_hist(img)
+    print(prof.stats())
+    prof.dump('stats-%i.json' % os.getpid())
+
+Stats from several worker processes can be combined with merge().
+'''
+import json
+import threading
+import time
+import tracemalloc
+
+
+_enabled = False
+_memory = False
+_owns_tracemalloc = False
+_stats = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.memory = _memory
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stack = _memory_stack()
+            if stack:
+                # Save the peak of the enclosing stage before resetting it.
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            stack.append([current, current])
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        n_bytes = 0
+        if self.memory:
+            _, peak = tracemalloc.get_traced_memory()
+            stack = _memory_stack()
+            start, stage_peak = stack.pop()
+            stage_peak = max(stage_peak, peak)
+            n_bytes = stage_peak - start
+            if stack:
+                stack[-1][1] = max(stack[-1][1], stage_peak)
+        with _lock:
+            stat = _stats.get(self.name)
+            if stat is None:
+                stat = _stats[self.name] = {'calls': 0, 'time': 0.0,
+                                            'bytes': 0}
+            stat['calls'] += 1
+            stat['time'] += elapsed
+            stat['bytes'] += n_bytes
+        return False
+
+
+def _memory_stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def stage(name):
+    ''' Return a context manager recording the enclosed code as the stage
+    name. '''
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def enable(memory=False):
+    ''' Start recording stages. With memory=True the peak allocation of each
+    stage is recorded as well. This starts tracemalloc, which slows down
+    allocation heavy code considerably. Allocations are traced process wide,
+    i.e. concurrently running threads are attributed to the current stage. '''
+    global _enabled, _memory, _owns_tracemalloc
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _owns_tracemalloc = True
+    _memory = memory
+    _enabled = True
+
+
+def _stop_tracemalloc():
+    global _owns_tracemalloc
+    if _owns_tracemalloc:
+        tracemalloc.stop()
+        _owns_tracemalloc = False
+
+
+def disable():
+    ''' Stop recording stages. The recorded stats are kept. '''
+    global _enabled, _memory
+    _stop_tracemalloc()
+    _enabled = False
+    _memory = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    ''' Discard all recorded stats. '''
+    with _lock:
+        _stats.clear()
+
+
+def stats():
+    ''' Return a dict mapping stage names to dicts with the keys 'calls',
+    'time' (seconds) and 'bytes' (sum of the peak allocations). '''
+    with _lock:
+        return dict((name, dict(stat)) for name, stat in _stats.items())
+
+
+def dump(path):
+    ''' Write the recorded stats to a JSON file. '''
+    with open(path, 'w') as f:
+        json.dump(stats(), f, indent=1, sort_keys=True)
+
+
+def load(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def merge(stats_list):
+    ''' Sum a list of stats dicts, e.g. loaded from the JSON files of several
+    worker processes. '''
+    merged = {}
+    for s in stats_list:
+        for name, stat in s.items():
+            m = merged.setdefault(name, {'calls': 0, 'time': 0.0,
+                                         'bytes': 0})
+            for key in m:
+                m[key] += stat.get(key, 0)
+    return merged
+
+
+class profile:
+    def __init__(self, memory=False, reset=True):
+        ''' Context manager enabling profiling for the enclosed code. The
+        previous profiling state is restored on exit. '''
+        self.memory = memory
+        self.reset = reset
+
+    def __enter__(self):
+        self.was_enabled = _enabled
+        self.had_memory = _memory
+        if self.reset:
+            reset()
+        enable(self.memory or self.had_memory)
+        return self
+
+    def __exit__(self, *exc):
+        global _enabled, _memory
+        if not self.had_memory:
+            _stop_tracemalloc()
+        _enabled = self.was_enabled
+        _memory = self.had_memory
+        return False
+
+    def stats(self):
+        return stats()
+
+    def dump(self, path):
+        dump(path)
@@ -0,0 +1,249 @@
+import numpy as np
+
+from .matching import nearest_neighbors
+
+
+def kmeans(X, n_clusters, n_iter=20, seed=None):
+    ''' Lloyd's k-means clustering.
+
+    Parameters
+    ----------
+    X: (n, d) array
+        Data points.
+    n_clusters: int
+        Number of clusters.
+    n_iter: int
+        Number of iterations.
+    seed: int
+        Seed for the random initialization.
+
+    Returns
+    -------
+    centroids: (n_clusters, d) array
+    labels: (n,) array
+    '''
+    X = np.asarray(X)
+    if X.shape[0] < n_clusters:
+        raise ValueError('Fewer data points than clusters.')
+    rng = np.random.RandomState(seed)
+    centroids = X[rng.choice(X.shape[0], n_clusters, replace=False)]
+    centroids = centroids.astype(np.result_type(X.dtype, np.float32))
+    for _ in range(n_iter):
+        _, labels = nearest_neighbors(X, centroids, k=1)
+        labels = labels[:, 0]
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.empty_like(centroids)
+        for j in range(X.shape[1]):
+            sums[:, j] = np.bincount(labels, X[:, j], minlength=n_clusters)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, np.newaxis]
+        # Restart empty clusters at random data points
+        n_empty = np.sum(~nonempty)
+        if n_empty > 0:
+            centroids[~nonempty] = X[rng.choice(X.shape[0], n_empty,
+                                                replace=False)]
+    _, labels = nearest_neighbors(X, centroids, k=1)
+    return centroids, labels[:, 0]
+
+
+class ProductQuantizer:
+    def __init__(self, n_subspaces=10, n_centroids=256):
+        ''' Product quantizer.
+
+        Vectors are split into n_subspaces equally sized sub-vectors which are
+        quantized independently with n_centroids centroids each. A vector is
+        thus encoded as n_subspaces uint8 codes.
+        '''
+        if n_centroids > 256:
+            raise ValueError('At most 256 centroids per subspace supported.')
+        self.n_subspaces = n_subspaces
+        self.n_centroids = n_centroids
+        self.codebooks = None
+
+    def _split(self, X):
+        n, d = X.shape
+        if d % self.n_subspaces != 0:
+            raise ValueError('Dimensionality %i not divisible by the number'
+                             ' of subspaces %i.' % (d, self.n_subspaces))
+        return np.reshape(X, (n, self.n_subspaces, d // self.n_subspaces))
+
+    def fit(self, X, n_iter=20, seed=None):
+        ''' Train the subspace codebooks on the rows of X. '''
+        X_sub = self._split(np.asarray(X))
+        self.codebooks = np.stack([
+            kmeans(X_sub[:, j, :], self.n_centroids, n_iter, seed)[0]
+            for j in range(self.n_subspaces)
+        ])
+        return self
+
+    def encode(self, X):
+        ''' Encode the rows of X as (n, n_subspaces) uint8 codes. '''
+        X_sub = self._split(np.asarray(X))
+        codes = np.empty(X_sub.shape[:2], dtype=np.uint8)
+        for j in range(self.n_subspaces):
+            _, idxs = nearest_neighbors(X_sub[:, j, :], self.codebooks[j],
+                                        k=1)
+            codes[:, j] = idxs[:, 0]
+        return codes
+
+    def decode(self, codes):
+        ''' Reconstruct vectors from their codes. '''
+        X_sub = self.codebooks[np.arange(self.n_subspaces), codes]
+        return np.reshape(X_sub, (codes.shape[0], -1))
+
+    def distance_tables(self, Q):
+        ''' Squared L2 distances between the sub-vectors of the rows of Q
+        and the subspace centroids as a (n, n_subspaces, n_centroids)
+        array. '''
+        Q_sub = self._split(np.asarray(Q))
+        tables = (np.sum(Q_sub**2, axis=2)[..., np.newaxis]
+                  - 2*np.einsum('nsd,scd->nsc', Q_sub, self.codebooks)
+                  + np.sum(self.codebooks**2, axis=2)[np.newaxis])
+        return np.maximum(tables, 0)
+
+    def asymmetric_distances(self, Q, codes):
+        ''' Squared L2 distances between the uncompressed rows of Q and the
+        encoded vectors as a (n_queries, n_codes) array. '''
+        tables = self.distance_tables(Q)
+        dists = np.zeros((tables.shape[0], codes.shape[0]),
+                         dtype=tables.dtype)
+        for j in range(self.n_subspaces):
+            dists += tables[:, j, codes[:, j]]
+        return dists
+
+
+class ScalarQuantizer:
+    def __init__(self):
+        ''' Scalar quantizer encoding every dimension as a uint8 in the value
+        range observed during training. '''
+        self.offset = None
+        self.step = None
+
+    def fit(self, X):
+        X = np.asarray(X)
+        self.offset = np.min(X, axis=0)
+        self.step = (np.max(X, axis=0) - self.offset) / 255.0
+        self.step[self.step == 0] = 1.0
+        return self
+
+    def encode(self, X):
+        codes = np.round((np.asarray(X) - self.offset) / self.step)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes):
+        return codes * self.step + self.offset
+
+    def asymmetric_distances(self, Q, codes, block_size=65536):
+        ''' Squared L2 distances between the uncompressed rows of Q and the
+        encoded vectors as a (n_queries, n_codes) array. '''
+        Q = np.asarray(Q)
+        q_norms = np.sum(Q**2, axis=1)[:, np.newaxis]
+        dists = np.empty((Q.shape[0], codes.shape[0]))
+        for start in range(0, codes.shape[0], block_size):
+            X = self.decode(codes[start:start+block_size])
+            d = q_norms - 2*np.dot(Q, X.T) + np.sum(X**2, axis=1)
+            dists[:, start:start+block_size] = np.maximum(d, 0)
+        return dists
+
+
+class PCA:
+    def __init__(self, n_components):
+        ''' Principal component analysis truncating vectors to their
+        n_components leading components. '''
+        self.n_components = n_components
+        self.mean = None
+        self.components = None
+
+    def fit(self, X):
+        X = np.asarray(X)
+        self.mean = np.mean(X, axis=0)
+        _, _, V = np.linalg.svd(X - self.mean, full_matrices=False)
+        self.components = V[:self.n_components]
+        return self
+
+    def transform(self, X):
+        return np.dot(np.asarray(X) - self.mean, self.components.T)
+
+    def inverse_transform(self, Y):
+        return np.dot(Y, self.components) + self.mean
+
+
+class DescriptorCompressor:
+    def __init__(self, n_components=None, quantizer='sq', n_subspaces=None,
+                 n_centroids=256):
+        ''' Trainable descriptor compression.
+
+        Descriptors are optionally truncated with PCA and then quantized with
+        a uint8 scalar quantizer ('sq'), a product quantizer ('pq') or not at
+        all (None). With the default 70-dimensional float64 jet descriptors,
+        'sq' shrinks the descriptors 8 times, PCA to 32 dimensions followed by
+        'sq' 17 times and followed by 'pq' with 8 subspaces 70 times.
+
+        Parameters
+        ----------
+        n_components: int
+            Number of principal components kept. None disables PCA.
+        quantizer: str
+            'sq', 'pq' or None.
+        n_subspaces: int
+            Number of product quantizer subspaces. It must divide the
+            descriptor dimensionality (n_components with PCA). Defaults to
+            the divisor closest to 8, e.g. 7 for 70-dimensional jet
+            descriptors.
+        n_centroids: int
+            Number of product quantizer centroids per subspace.
+        '''
+        if quantizer not in ['sq', 'pq', None]:
+            raise ValueError('Invalid quantizer.')
+        self.pca = None if n_components is None else PCA(n_components)
+        if quantizer == 'sq':
+            self.quantizer = ScalarQuantizer()
+        elif quantizer == 'pq':
+            self.quantizer = ProductQuantizer(n_subspaces, n_centroids)
+        else:
+            self.quantizer = None
+
+    def fit(self, descs, seed=None):
+        ''' Train the compression on a (n, d) array of descriptors, e.g. the
+        output of JetDescriptor.compute() or stacked normalized histograms. '''
+        X = np.asarray(descs)
+        if self.pca is not None:
+            X = self.pca.fit(X).transform(X)
+        if isinstance(self.quantizer, ProductQuantizer):
+            if self.quantizer.n_subspaces is None:
+                d = X.shape[1]
+                divisors = [n for n in range(1, d+1) if d % n == 0]
+                self.quantizer.n_subspaces = min(divisors,
+                                                 key=lambda n: abs(n - 8))
+            self.quantizer.fit(X, seed=seed)
+        elif self.quantizer is not None:
+            self.quantizer.fit(X)
+        return self
+
+    def encode(self, descs):
+        X = np.asarray(descs)
+        if self.pca is not None:
+            X = self.pca.transform(X)
+        if self.quantizer is not None:
+            X = self.quantizer.encode(X)
+        return X
+
+    def decode(self, codes):
+        X = codes
+        if self.quantizer is not None:
+            X = self.quantizer.decode(X)
+        if self.pca is not None:
+            X = self.pca.inverse_transform(X)
+        return X
+
+    def asymmetric_distances(self, queries, codes):
+        ''' Squared L2 distances between uncompressed queries and encoded
+        descriptors as a (n_queries, n_codes) array. The distances are
+        computed in the PCA subspace. '''
+        Q = np.asarray(queries)
+        if self.pca is not None:
+            Q = self.pca.transform(Q)
+        if self.quantizer is not None:
+            return self.quantizer.asymmetric_distances(Q, codes)
+        return (np.sum(Q**2, axis=1)[:, np.newaxis] - 2*np.dot(Q, codes.T)
+                + np.sum(codes**2, axis=1))
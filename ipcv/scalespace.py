@@ -1,5 +1,9 @@
 import numpy as np
-from scipy.ndimage.filters import gaussian_filter
+
+from . import fused
+from .filtering import box_derivatives, gaussian_filter
+from .misc.workspace import get_workspace
+from .profiling import stage
 
 
 class ScaleSpace:
@@ -32,8 +36,10 @@ class ScaleSpace:
 
     def compute(self, img):
         ''' Compute the scale space of an image.'''
-        img_f = np.fft.fft2(img)
-        return [np.fft.ifft2(np.multiply(img_f, f)).real for f in self.filters]
+        with stage('scalespace_fft'):
+            img_f = np.fft.fft2(img)
+            return [np.fft.ifft2(np.multiply(img_f, f)).real
+                    for f in self.filters]
 
 
 def scalespace(img, sigma, order=(0, 0)):
@@ -44,49 +50,85 @@ def scalespace(img, sigma, order=(0, 0)):
     return ss.compute(img)[0]
 
 
-def gradient_orientation(img, scale, signed=True, fft=False):
-    '''Calculate gradient orientations at scale sigma.'''
+def spatial_filter_args(ndim, scale, order):
+    '''sigma and order arguments for gaussian_filter() filtering only the last
+    two axes of an ndim dimensional stack of images.'''
+    if ndim == 2:
+        return scale, order
+    lead = (0,)*(ndim-2)
+    return lead + (scale, scale), lead + tuple(order)
+
+
+def _derivatives(img, scale, orders, fft, box, workspace, prefix):
+    '''Scale normalized Gaussian derivatives of img written to workspace
+    buffers.'''
     normalizer = scale**2
-    if fft:
-        Ly = normalizer*scalespace(img, scale, order=(1, 0))
-        Lx = normalizer*scalespace(img, scale, order=(0, 1))
+    derivs = [workspace.get(prefix + 'L%i%i' % order) for order in orders]
+    if fft and box:
+        raise ValueError('fft and box are mutually exclusive.')
+    if box:
+        with stage('box_filter'):
+            box_derivatives(img, scale, orders, derivs)
+        for L in derivs:
+            L *= normalizer
+    elif fft:
+        ss = workspace.scalespace(scale, orders)
+        for L, deriv in zip(derivs, ss.compute(img)):
+            np.multiply(deriv, normalizer, out=L)
     else:
-        mode = 'reflect'
-        Ly = normalizer*gaussian_filter(img, scale, order=(1, 0), mode=mode)
-        Lx = normalizer*gaussian_filter(img, scale, order=(0, 1), mode=mode)
+        with stage('gaussian_filter'):
+            for L, order in zip(derivs, orders):
+                sigma, order = spatial_filter_args(img.ndim, scale, order)
+                gaussian_filter(img, sigma, order=order, output=L,
+                                mode='reflect')
+                L *= normalizer
+    return derivs
+
+
+def gradient_orientation(img, scale, signed=True, fft=False, workspace=None,
+                         box=False):
+    '''Calculate gradient orientations at scale sigma.
+
+    img may be a single (h, w) image or a (n, h, w) stack of images that are
+    processed independently. If a Workspace is given, the returned arrays are
+    views of its buffers. box=True approximates the Gaussian derivatives with
+    box filters, see filtering.box_derivatives().'''
+    ws = get_workspace(workspace, img)
+    Ly, Lx = _derivatives(img, scale, [(1, 0), (0, 1)], fft, box, ws,
+                          'go.')
+    go = ws.get('go.go')
+    go_m = ws.get('go.go_m')
     if signed:
-        go = np.arctan2(Ly, Lx)
+        np.arctan2(Ly, Lx, out=go)
     else:
-        go = np.arctan(Ly/(Lx + 1e-10))
-    go_m = np.sqrt(Lx**2+Ly**2)
+        np.add(Lx, 1e-10, out=go)
+        np.divide(Ly, go, out=go)
+        np.arctan(go, out=go)
+    np.square(Lx, out=go_m)
+    Ly **= 2
+    go_m += Ly
+    np.sqrt(go_m, out=go_m)
     return go, go_m
 
 
-def shape_index(img, scale, orientations=False, fft=False):
-    '''Calculate the shape index at the given scale.'''
-    normalizer = scale**2
-    if fft:
-        Lyy = normalizer*scalespace(img, scale, order=(2, 0))
-        Lxy = normalizer*scalespace(img, scale, order=(1, 1))
-        Lxx = normalizer*scalespace(img, scale, order=(0, 2))
-    else:
-        mode = 'reflect'
-        Lyy = normalizer*gaussian_filter(img, scale, order=(2, 0), mode=mode)
-        Lxy = normalizer*gaussian_filter(img, scale, order=(1, 1), mode=mode)
-        Lxx = normalizer*gaussian_filter(img, scale, order=(0, 2), mode=mode)
-
-    si = np.arctan((-Lxx-Lyy) / (np.sqrt((Lxx - Lyy)**2+4*Lxy**2)+1e-10))
-    si_c = .5*np.sqrt(Lxx**2 + 2*Lxy**2 + Lyy**2)
+def shape_index(img, scale, orientations=False, fft=False, workspace=None,
+                box=False):
+    '''Calculate the shape index at the given scale.
 
+    img may be a single (h, w) image or a (n, h, w) stack of images that are
+    processed independently. If a Workspace is given, the returned arrays are
+    views of its buffers. box=True approximates the Gaussian derivatives with
+    box filters, see filtering.box_derivatives().'''
+    ws = get_workspace(workspace, img)
+    Lyy, Lxy, Lxx = _derivatives(img, scale, [(2, 0), (1, 1), (0, 2)], fft,
+                                 box, ws, 'si.')
+    si = ws.get('si.si')
+    si_c = ws.get('si.si_c')
     if orientations:
-        t = Lxx + Lyy
-        d = Lxx*Lyy - Lxy**2
-        l1 = t/2.0 + np.sqrt(np.abs(t**2/4 - d))
-        l2 = t/2.0 - np.sqrt(np.abs(t**2/4 - d))
-        y = l1-Lyy
-        x = Lxy
-        si_o = np.arctan(y/(x+1e-10))
-        si_om = l1-l2
+        si_o = ws.get('si.si_o')
+        si_om = ws.get('si.si_om')
+        fused.shape_index(Lyy, Lxy, Lxx, si, si_c, si_o, si_om)
         return si, si_c, si_o, si_om
     else:
+        fused.shape_index(Lyy, Lxy, Lxx, si, si_c)
         return si, si_c
@@ -0,0 +1,142 @@
+import collections
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from .bif import bif_hist
+from .feature_histograms import go_hist, si_hist, josi_hist, scales
+from .misc import donuts, Workspace
+
+
+_METHODS = {
+    'go_hist': go_hist,
+    'si_hist': si_hist,
+    'josi_hist': josi_hist,
+    'bif_hist': bif_hist,
+}
+
+
+class StreamProcessor:
+    def __init__(self, frame_shape, method='go_hist', decode=None,
+                 donut_params=None, n_threads=2, max_pending=None,
+                 dtype=np.float64, **kwargs):
+        ''' Compute histogram descriptors of a stream of same-sized frames.
+
+        Everything that does not depend on the frame content is set up once:
+        the scales, the spatial weights and, per worker thread, a Workspace
+        holding the scratch buffers and Fourier domain filters (fft=True).
+        Frames are decoded, filtered and reduced in a small thread pool. E.g.
+
+            sp = StreamProcessor((480, 640), 'go_hist', decode=imread,
+                                 donut_params={'n_donuts': 4,
+                                               'radius_max': 200,
+                                               'width_min': 30})
+            for hist in sp.process_many(paths):
+                ...
+
+        Parameters
+        ----------
+        frame_shape: (h, w) or (h, w, c) tuple
+            Shape of the decoded frames. Channels are processed
+            independently.
+        method: str
+            One of 'go_hist', 'si_hist', 'josi_hist' and 'bif_hist'.
+        decode: callable
+            Optional function mapping the items passed to process() to
+            frames, e.g. util.imread. Decoding runs in the thread
+            pool.
+        donut_params: dict
+            Keyword arguments for misc.donuts() specifying a bank of spatial
+            weights. Not supported by 'bif_hist'.
+        n_threads: int
+            Number of frames processed in parallel.
+        max_pending: int
+            Maximum number of frames in flight in process_many(). Defaults to
+            2*n_threads.
+        dtype: dtype
+            Dtype of the workspace buffers.
+        kwargs:
+            Further arguments for the histogram function, e.g. scales,
+            n_bins or fft. 'scales' may also be given as n_scales, scale_min
+            and scale_ratio for all methods.
+        '''
+        if method not in _METHODS:
+            raise ValueError('Invalid method %s.' % method)
+        self.frame_shape = tuple(frame_shape)
+        if len(self.frame_shape) == 3:
+            # Channels are processed as a stack of images
+            h, w, c = self.frame_shape
+            self.stack_shape = (c, h, w)
+        else:
+            self.stack_shape = self.frame_shape
+        self.method = method
+        self.fun = _METHODS[method]
+        self.decode = decode
+        self.n_threads = n_threads
+        self.max_pending = 2*n_threads if max_pending is None else max_pending
+        self.dtype = dtype
+        if method == 'bif_hist':
+            if donut_params is not None:
+                raise ValueError('bif_hist does not support spatial weights.')
+        else:
+            if 'scales' not in kwargs:
+                kwargs['scales'] = scales(kwargs.pop('n_scales', 4),
+                                          kwargs.pop('scale_min', 1.0),
+                                          kwargs.pop('scale_ratio', 2.0))
+            if donut_params is not None:
+                kwargs['weights'] = donuts(self.frame_shape[:2],
+                                           **donut_params)
+        self.kwargs = kwargs
+        self._local = threading.local()
+        self._executor = None
+
+    def _workspace(self):
+        ws = getattr(self._local, 'workspace', None)
+        if ws is None:
+            ws = Workspace(self.stack_shape, self.dtype)
+            self._local.workspace = ws
+        return ws
+
+    def process(self, frame):
+        ''' Return the histogram of a single frame. '''
+        if self.decode is not None:
+            frame = self.decode(frame)
+        frame = np.asarray(frame, dtype=self.dtype)
+        if frame.shape != self.frame_shape:
+            raise ValueError('Frame shape %s does not match %s.'
+                             % (frame.shape, self.frame_shape))
+        return self.fun(frame, workspace=self._workspace(), **self.kwargs)
+
+    def process_many(self, frames):
+        ''' Process an iterable of frames in the thread pool.
+
+        Returns a generator yielding the histograms in the order of frames.
+        At most max_pending frames are in flight, which bounds both memory
+        use and the latency between reading a frame and yielding its
+        histogram.
+        '''
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.n_threads)
+        pending = collections.deque()
+        try:
+            for frame in frames:
+                if len(pending) >= self.max_pending:
+                    yield pending.popleft().result()
+                pending.append(self._executor.submit(self.process, frame))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -1,14 +1,36 @@
-from .image import (stretch_intensity, imsave, tile, patch, extract_patches)
+from .image import (stretch_intensity, imread, imsave, tile, tile_stream,
+                    patch, patches, extract_patches)
+from .image_cache import ImageCache, ImageDataset
+from .image_writer import ImageWriter
 from .interest_points import (read_keypoints, write_keypoints, draw_keypoint,
                               extract_keypoint)
+from .memoize import ResultCache
+from .binary_keypoints import (KeypointWriter, read_keypoints_binary,
+                               write_keypoints_binary,
+                               append_keypoints_binary, kp_to_binary,
+                               binary_to_kp, iter_keypoints)
 
 
 __all__ = ['stretch_intensity',
+           'imread',
            'imsave',
+           'ImageWriter',
+           'ImageCache',
+           'ImageDataset',
+           'ResultCache',
            'tile',
+           'tile_stream',
            'patch',
+           'patches',
            'extract_patches',
            'read_keypoints',
            'write_keypoints',
            'draw_keypoint',
-           'extract_keypoint']
+           'extract_keypoint',
+           'KeypointWriter',
+           'read_keypoints_binary',
+           'write_keypoints_binary',
+           'append_keypoints_binary',
+           'kp_to_binary',
+           'binary_to_kp',
+           'iter_keypoints']
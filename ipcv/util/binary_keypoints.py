@@ -0,0 +1,235 @@
+import itertools
+import os
+import numpy as np
+
+from .interest_points import read_keypoints, write_keypoints
+
+
+MAGIC = b'IPCVKPB1'
+HEADER_DTYPE = np.dtype([('magic', 'S8'),
+                         ('n_keypoints', '<u8'),
+                         ('kp_dim', '<u4'),
+                         ('desc_dim', '<u4'),
+                         ('kp_dtype', 'S8'),
+                         ('desc_dtype', 'S8'),
+                         ('reserved', 'S24')])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+
+def _record_dtype(kp_dim, desc_dim, kp_dtype, desc_dtype):
+    fields = [('keypoint', np.dtype(kp_dtype), (kp_dim,))]
+    if desc_dim > 0:
+        fields.append(('desc', np.dtype(desc_dtype), (desc_dim,)))
+    return np.dtype(fields)
+
+
+def read_header(path):
+    ''' Read the header of a binary keypoint file as a dict. '''
+    with open(path, 'rb') as f:
+        header = np.fromfile(f, dtype=HEADER_DTYPE, count=1)
+    if len(header) != 1 or header['magic'][0] != MAGIC:
+        raise ValueError('%s is not a binary keypoint file.' % path)
+    header = header[0]
+    return {'n_keypoints': int(header['n_keypoints']),
+            'kp_dim': int(header['kp_dim']),
+            'desc_dim': int(header['desc_dim']),
+            'kp_dtype': np.dtype(header['kp_dtype'].decode()),
+            'desc_dtype': np.dtype(header['desc_dtype'].decode())}
+
+
+class KeypointWriter:
+    def __init__(self, path, kp_dim=5, desc_dim=0, kp_dtype=np.float64,
+                 desc_dtype=np.float64, append=False):
+        ''' Write keypoints and descriptors to a binary keypoint file.
+
+        The file consists of a fixed-size header holding the number of
+        keypoints, the keypoint and descriptor dimensions and dtypes followed
+        by one contiguous record per keypoint. If append is True and the file
+        exists, records are appended to it; its header must then match the
+        given dimensions and dtypes.
+        '''
+        self.path = path
+        self.kp_dim = kp_dim
+        self.desc_dim = desc_dim
+        self.kp_dtype = np.dtype(kp_dtype)
+        self.desc_dtype = np.dtype(desc_dtype)
+        self.record_dtype = _record_dtype(kp_dim, desc_dim, kp_dtype,
+                                          desc_dtype)
+        if append and os.path.exists(path):
+            header = read_header(path)
+            if (header['kp_dim'] != kp_dim or header['desc_dim'] != desc_dim
+                    or header['kp_dtype'] != self.kp_dtype
+                    or (desc_dim > 0
+                        and header['desc_dtype'] != self.desc_dtype)):
+                raise ValueError('Cannot append to %s: header mismatch.'
+                                 % path)
+            self.n_keypoints = header['n_keypoints']
+            self.f = open(path, 'r+b')
+            self.f.seek(HEADER_SIZE + self.n_keypoints
+                        * self.record_dtype.itemsize)
+            self.f.truncate()
+        else:
+            self.n_keypoints = 0
+            self.f = open(path, 'w+b')
+            self._write_header()
+
+    def _write_header(self):
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['n_keypoints'] = self.n_keypoints
+        header['kp_dim'] = self.kp_dim
+        header['desc_dim'] = self.desc_dim
+        header['kp_dtype'] = self.kp_dtype.str.encode()
+        header['desc_dtype'] = self.desc_dtype.str.encode()
+        pos = self.f.tell()
+        self.f.seek(0)
+        self.f.write(header.tobytes())
+        self.f.seek(max(pos, HEADER_SIZE))
+
+    def write(self, keypoints, descs=None):
+        ''' Append a (n, kp_dim) keypoint array and optionally a
+        (n, desc_dim) descriptor array to the file. '''
+        keypoints = np.asarray(keypoints)
+        if keypoints.ndim != 2 or keypoints.shape[1] != self.kp_dim:
+            raise ValueError('Invalid keypoint array shape.')
+        records = np.empty(keypoints.shape[0], dtype=self.record_dtype)
+        records['keypoint'] = keypoints
+        if self.desc_dim > 0:
+            if descs is None or descs.shape != (keypoints.shape[0],
+                                                self.desc_dim):
+                raise ValueError('Invalid descriptor array shape.')
+            records['desc'] = descs
+        elif descs is not None:
+            raise ValueError('File has no descriptors.')
+        self.f.write(records.tobytes())
+        self.n_keypoints += len(records)
+        self._write_header()
+
+    def truncate(self, n_keypoints):
+        ''' Discard all but the first n_keypoints records. '''
+        if n_keypoints > self.n_keypoints:
+            raise ValueError('Cannot truncate %s to %i keypoints, it holds '
+                             '%i.' % (self.path, n_keypoints,
+                                      self.n_keypoints))
+        self.n_keypoints = n_keypoints
+        self.f.seek(HEADER_SIZE + n_keypoints*self.record_dtype.itemsize)
+        self.f.truncate()
+        self._write_header()
+
+    def flush(self, sync=False):
+        ''' Flush the file. If sync is True, it is also synced to disk. '''
+        self.f.flush()
+        if sync:
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        if not self.f.closed:
+            self.f.flush()
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_keypoints_binary(path, keypoints, descs=None, desc_dtype=None):
+    ''' Write keypoints and descriptors to a new binary keypoint file. The
+    descriptors are stored as desc_dtype (default: the dtype of descs). '''
+    if descs is None:
+        desc_dim = 0
+        desc_dtype = np.float64
+    else:
+        desc_dim = descs.shape[1]
+        if desc_dtype is None:
+            desc_dtype = descs.dtype
+    with KeypointWriter(path, keypoints.shape[1], desc_dim, keypoints.dtype,
+                        desc_dtype) as writer:
+        writer.write(keypoints, descs)
+
+
+def append_keypoints_binary(path, keypoints, descs=None):
+    ''' Append keypoints and descriptors to a binary keypoint file. The file
+    is created if it does not exist. '''
+    if os.path.exists(path):
+        header = read_header(path)
+        kp_dtype = header['kp_dtype']
+        desc_dtype = header['desc_dtype']
+    else:
+        kp_dtype = keypoints.dtype
+        desc_dtype = np.float64 if descs is None else descs.dtype
+    desc_dim = 0 if descs is None else descs.shape[1]
+    with KeypointWriter(path, keypoints.shape[1], desc_dim, kp_dtype,
+                        desc_dtype, append=True) as writer:
+        writer.write(keypoints, descs)
+
+
+def read_keypoints_binary(path, mode='r'):
+    ''' Memory-map a binary keypoint file.
+
+    Returns
+    -------
+    keypoints: (n, kp_dim) array
+        Zero-copy view of the keypoints.
+    descs: (n, desc_dim) array or None
+        Zero-copy view of the descriptors if the file contains any.
+    '''
+    header = read_header(path)
+    record_dtype = _record_dtype(header['kp_dim'], header['desc_dim'],
+                                 header['kp_dtype'], header['desc_dtype'])
+    n = header['n_keypoints']
+    if n == 0:
+        records = np.empty(0, dtype=record_dtype)
+    else:
+        records = np.memmap(path, dtype=record_dtype, mode=mode,
+                            offset=HEADER_SIZE, shape=(n,))
+    descs = records['desc'] if header['desc_dim'] > 0 else None
+    return records['keypoint'], descs
+
+
+def kp_to_binary(src_path, dst_path, desc_dtype=None, kp_dim=5):
+    ''' Convert a text keypoint file to the binary format. '''
+    data = read_keypoints(src_path)
+    data = np.reshape(data, (-1, data.shape[-1]))
+    keypoints = data[:, :kp_dim]
+    descs = data[:, kp_dim:] if data.shape[1] > kp_dim else None
+    write_keypoints_binary(dst_path, keypoints, descs, desc_dtype)
+
+
+def binary_to_kp(src_path, dst_path):
+    ''' Convert a binary keypoint file to the text format. '''
+    keypoints, descs = read_keypoints_binary(src_path)
+    keypoints = np.asarray(keypoints, dtype=float)
+    if descs is not None:
+        descs = np.asarray(descs, dtype=float)
+    write_keypoints(dst_path, keypoints, descs)
+
+
+def iter_keypoints(path, chunk_size=10000):
+    ''' Iterate over the keypoints of a text or binary keypoint file in
+    chunks of at most chunk_size rows without loading the whole file.
+
+    For text files each chunk has the same layout as the array returned by
+    read_keypoints(). For binary files each chunk is a zero-copy view of the
+    keypoints.
+    '''
+    with open(path, 'rb') as f:
+        is_binary = f.read(len(MAGIC)) == MAGIC
+    if is_binary:
+        keypoints, _ = read_keypoints_binary(path)
+        for start in range(0, len(keypoints), chunk_size):
+            yield keypoints[start:start+chunk_size]
+    else:
+        with open(path, 'r') as f:
+            f.readline()
+            num_keypoints = int(float(f.readline()))
+            n_read = 0
+            while True:
+                lines = list(itertools.islice(f, chunk_size))
+                if len(lines) == 0:
+                    break
+                data = np.loadtxt(lines, ndmin=2)
+                n_read += data.shape[0]
+                yield data
+        assert(num_keypoints == n_read)
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import threading
+import numpy as np
+
+
+class DiskCache:
+    def __init__(self, cache_dir, max_bytes=None):
+        ''' Store arrays as .npy files in cache_dir, keyed by hex strings.
+
+        Arrays are written to a temporary file and renamed into place, so
+        several processes may share the same cache directory. Reads touch the
+        file modification time; when the cache grows beyond max_bytes the
+        least recently used files are deleted.
+        '''
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                if not os.path.isdir(cache_dir):
+                    raise
+        self.n_bytes = sum(size for _, _, size in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.npy')
+
+    def _entries(self):
+        ''' Yield (path, mtime, size) of all cached files. '''
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if not filename.endswith('.npy'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # Deleted by another process
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def get(self, key, mmap_mode='r'):
+        ''' Return the array stored under key or None. With mmap_mode 'r'
+        the array is memory-mapped read-only. '''
+        path = self._path(key)
+        try:
+            arr = np.load(path, mmap_mode=mmap_mode)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return arr
+
+    def put(self, key, arr):
+        ''' Store arr under key. '''
+        path = self._path(key)
+        dirpath = os.path.dirname(path)
+        if not os.path.isdir(dirpath):
+            try:
+                os.makedirs(dirpath)
+            except OSError:
+                if not os.path.isdir(dirpath):
+                    raise
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=dirpath)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, arr)
+            try:
+                # Size of the file replaced when overwriting a key
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        with self.lock:
+            self.n_bytes += os.path.getsize(path) - old_size
+            evict = self.max_bytes is not None and self.n_bytes > self.max_bytes
+        if evict:
+            self.evict()
+
+    def evict(self):
+        ''' Delete the least recently used files until the cache is below
+        max_bytes. '''
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        n_bytes = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self.max_bytes is None or n_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            n_bytes -= size
+        with self.lock:
+            self.n_bytes = n_bytes
+
+    def clear(self):
+        for path, _, _ in list(self._entries()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self.lock:
+            self.n_bytes = 0
+
+    def stats(self):
+        ''' Return hit/miss counts and the cache size in bytes. '''
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'bytes': self.n_bytes}
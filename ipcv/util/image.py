@@ -1,6 +1,35 @@
+import itertools
 import os
 import numpy as np
-import scipy as sp
+from numpy.lib.stride_tricks import as_strided
+
+
+def imread(path, flatten=False):
+    ''' Read an image file. If flatten is True the image is converted to a
+    float grayscale image. '''
+    try:
+        from scipy.misc import imread
+    except ImportError:
+        # scipy.misc.imread was removed in SciPy 1.2.
+        from PIL import Image
+        img = Image.open(path)
+        if flatten:
+            img = img.convert('F')
+        return np.asarray(img)
+    return imread(path, flatten=flatten)
+
+
+def _imwrite(path, img):
+    try:
+        from scipy.misc import imsave
+    except ImportError:
+        # scipy.misc.imsave was removed in SciPy 1.2.
+        from PIL import Image
+        if img.dtype != np.uint8:
+            img = (255*stretch_intensity(img)).astype(np.uint8)
+        Image.fromarray(img).save(path)
+        return
+    imsave(path, img)
 
 
 def stretch_intensity(img):
@@ -16,60 +45,105 @@ def imsave(path, img, stretch=True):
     dirpath = os.path.dirname(path)
     if len(dirpath) > 0 and not os.path.exists(dirpath):
         os.makedirs(dirpath)
-    sp.misc.imsave(path, img)
-
-
-def tile(imgs, aspect_ratio=1.0, tile_shape=None):
-    ''' Tile images in a grid.
+    _imwrite(path, img)
 
-    If tile_shape is provided only as many images as specified in tile_shape
-    will be included in the output.
-    '''
 
-    # Prepare images
-    imgs = np.array(imgs)
-    n_imgs = imgs.shape[0]
-    img_shape = imgs.shape[1:]
-    assert len(img_shape) == 2 or len(img_shape) == 3
-    if len(img_shape) == 2:
-        # Add color dimension to greyscale images. This allows the rest of the
-        # code to assume the image has a color dimension.
-        imgs = np.reshape(imgs, imgs.shape + (1,))
-        img_shape = img_shape+(1,)
-
-    # Calculate grid shape
-    img_shape = np.array(img_shape)
+def _grid_shape(n_imgs, img_shape, aspect_ratio, tile_shape):
     if tile_shape is None:
         img_aspect_ratio = img_shape[0] / float(img_shape[1])
         aspect_ratio *= img_aspect_ratio
         tile_height = int(np.ceil(np.sqrt(n_imgs) * aspect_ratio))
         tile_width = int(np.ceil(np.sqrt(n_imgs) * 1/aspect_ratio))
-        grid_shape = np.array((tile_height, tile_width))
+        return (tile_height, tile_width)
     else:
         assert len(tile_shape) == 2
-        grid_shape = np.array(tile_shape)
+        return tuple(tile_shape)
 
-    # Calculate tile image shape
-    spacing = 1
-    tile_img_shape = img_shape.copy()
-    tile_img_shape[:2] = (img_shape[:2] + spacing) * grid_shape[:2] - spacing
+
+def _tile_canvas(img_shape, grid_shape, spacing, out, dtype):
+    ''' Allocate (or check) the tile image and return it together with a
+    writable (grid_h, grid_w, h, w, c) view of the grid cells. '''
+    h, w = img_shape[:2]
+    tile_img_shape = ((h + spacing) * grid_shape[0] - spacing,
+                      (w + spacing) * grid_shape[1] - spacing)
+    tile_img_shape += tuple(img_shape[2:])
+    if out is None:
+        out = np.empty(tile_img_shape, dtype=dtype)
+    elif out.shape != tile_img_shape:
+        raise ValueError('out must have shape %s.' % (tile_img_shape,))
+    # Add color dimension to greyscale images. This allows the rest of the
+    # code to assume the image has a color dimension.
+    canvas = out if out.ndim == 3 else out[..., np.newaxis]
+    s_y, s_x, s_c = canvas.strides
+    cells = as_strided(canvas, shape=tuple(grid_shape) + (h, w,
+                                                          canvas.shape[2]),
+                       strides=(s_y*(h+spacing), s_x*(w+spacing), s_y, s_x,
+                                s_c))
+    return out, cells
+
+
+def tile(imgs, aspect_ratio=1.0, tile_shape=None, out=None, fill=None):
+    ''' Tile images in a grid.
+
+    If tile_shape is provided only as many images as specified in tile_shape
+    will be included in the output. The images are written directly into
+    out if given, e.g. a np.memmap of the tile image shape. fill is the
+    background value and defaults to the smallest image intensity.
+    '''
+    n_imgs = len(imgs)
+    img_shape = imgs[0].shape
+    assert len(img_shape) == 2 or len(img_shape) == 3
+    grid_shape = _grid_shape(n_imgs, img_shape, aspect_ratio, tile_shape)
+    n_imgs = min(n_imgs, grid_shape[0]*grid_shape[1])
+    if fill is None:
+        if isinstance(imgs, np.ndarray):
+            fill = np.min(imgs[:n_imgs])
+        else:
+            fill = min(np.min(img) for img in imgs[:n_imgs])
 
     # Assemble tile image
-    tile_img = np.ones(tile_img_shape)*np.min(imgs)
-    for i in range(grid_shape[0]):
-        for j in range(grid_shape[1]):
-            img_idx = j + i*grid_shape[0]
-            if img_idx >= n_imgs:
-                # No more images - stop filling out the grid.
-                break
-            img = imgs[img_idx]
-            yoff = (img_shape[0] + spacing) * i
-            xoff = (img_shape[1] + spacing) * j
-            tile_img[yoff:yoff+img_shape[0], xoff:xoff+img_shape[1], :] = img
+    spacing = 1
+    tile_img, cells = _tile_canvas(img_shape, grid_shape, spacing, out,
+                                   float)
+    tile_img[...] = fill
+    grid_w = grid_shape[1]
+    n_rows = int(np.ceil(n_imgs / float(grid_w)))
+    for i in range(n_rows):
+        row = imgs[i*grid_w:min((i+1)*grid_w, n_imgs)]
+        row = np.reshape(np.asarray(row), (len(row),) + cells.shape[2:])
+        cells[i, :len(row)] = row
+
+    # Squeeze color channel away if image is greyscale
+    return np.squeeze(tile_img)
+
+
+def tile_stream(imgs, n_imgs, img_shape, aspect_ratio=1.0, tile_shape=None,
+                out=None, fill=0.0):
+    ''' Tile images from an iterable in a grid.
+
+    Like tile() but the images are consumed one grid row at a time such that
+    only a single row of images is held in memory. Use a np.memmap for out to
+    assemble tile images that do not fit in memory.
+    '''
+    assert len(img_shape) == 2 or len(img_shape) == 3
+    grid_shape = _grid_shape(n_imgs, img_shape, aspect_ratio, tile_shape)
+    n_imgs = min(n_imgs, grid_shape[0]*grid_shape[1])
+
+    spacing = 1
+    tile_img, cells = _tile_canvas(img_shape, grid_shape, spacing, out,
+                                   float)
+    tile_img[...] = fill
+    grid_w = grid_shape[1]
+    imgs = iter(imgs)
+    for i in range(int(np.ceil(n_imgs / float(grid_w)))):
+        row = list(itertools.islice(imgs, min(grid_w, n_imgs-i*grid_w)))
+        if len(row) == 0:
+            break
+        row = np.reshape(np.asarray(row), (len(row),) + cells.shape[2:])
+        cells[i, :len(row)] = row
 
     # Squeeze color channel away if image is greyscale
-    tile_img = np.squeeze(tile_img)
-    return tile_img
+    return np.squeeze(tile_img)
 
 
 def patch(img, pt, patch_size, padding='none'):
@@ -86,36 +160,150 @@ def patch(img, pt, patch_size, padding='none'):
     if padding == 'none':
         patch = img[y_min:y_max, x_min:x_max, ...]
     else:
-        y_offset = max(0, -(pt[0]-radius))
-        x_offset = max(0, -(pt[1]-radius))
-        height = y_max-y_min
-        width = x_max-x_min
-        if padding == 'zero':
-            patch = np.zeros((patch_size, patch_size))
-            patch[y_offset:y_offset+height, x_offset:x_offset+width, ...] = \
-                img[y_min:y_max, x_min:x_max, ...]
-        elif padding == 'mirror':
-            raise NotImplementedError
-        else:
-            raise ValueError('Invalid padding method')
+        # Pad only the neighbourhood of the patch.
+        y_min = max(0, pt[0]-patch_size)
+        x_min = max(0, pt[1]-patch_size)
+        region = img[y_min:pt[0]+patch_size, x_min:pt[1]+patch_size, ...]
+        patch = patches(region, [(pt[0]-y_min, pt[1]-x_min)], patch_size,
+                        padding)[0]
     return patch
 
 
+def _patch_view(img, patch_size, axis=0):
+    ''' Zero-copy view of all patch_size x patch_size patches of img. The
+    spatial dimensions of img are axis and axis+1. Patch (y, x) has its top
+    left corner at img[y, x]. '''
+    h, w = img.shape[axis:axis+2]
+    shape = (img.shape[:axis] + (h-patch_size+1, w-patch_size+1)
+             + (patch_size, patch_size) + img.shape[axis+2:])
+    strides = img.strides[:axis+2] + img.strides[axis:]
+    return as_strided(img, shape=shape, strides=strides, writeable=False)
+
+
+_PAD_MODES = {'zero': 'constant',
+              'reflect': 'symmetric',
+              'mirror': 'reflect',
+              'edge': 'edge'}
+
+
+def patches(img, points, patch_size, padding='zero'):
+    ''' Extract patches centered at the given points.
+
+    The image is padded once such that patches crossing the image border need
+    no special treatment. The patches are then gathered in one indexing
+    operation from a strided view of the padded image.
+
+    Parameters
+    ----------
+    img: (h, w) or (h, w, c) array
+        Input image.
+    points: (K, 2) array
+        Integer (y, x) patch centers.
+    patch_size: int
+        Patch height and width.
+    padding: str
+        How the image is extended beyond its border: 'zero', 'reflect'
+        (d c b a | a b c d), 'mirror' (d c b | a b c d), 'edge' or 'none'.
+        With 'none' all patches must lie within the image, otherwise the
+        patch centers must lie within the image.
+
+    Returns
+    -------
+    patches: (K, patch_size, patch_size) or (K, patch_size, patch_size, c)
+        array
+    '''
+    points = np.reshape(np.asarray(points, dtype=int), (-1, 2))
+    radius = patch_size//2
+    ys = points[:, 0]
+    xs = points[:, 1]
+    if padding == 'none':
+        ys = ys-radius
+        xs = xs-radius
+        if (np.any(ys < 0) or np.any(xs < 0)
+                or np.any(ys > img.shape[0]-patch_size)
+                or np.any(xs > img.shape[1]-patch_size)):
+            raise ValueError('Patches exceed the image border.')
+    elif padding in _PAD_MODES:
+        if (np.any(ys < 0) or np.any(xs < 0) or np.any(ys >= img.shape[0])
+                or np.any(xs >= img.shape[1])):
+            raise ValueError('Patch centers outside the image.')
+        pad_width = ([(radius, patch_size-radius-1)]*2
+                     + [(0, 0)]*(img.ndim-2))
+        img = np.pad(img, pad_width, mode=_PAD_MODES[padding])
+    else:
+        raise ValueError('Invalid padding method')
+    return _patch_view(img, patch_size)[ys, xs]
+
+
 def extract_patches(imgs, n_patches, patch_size, random_seed=None,
-                    filter_fun=None):
+                    filter_fun=None, batch_filter=False, batch_size=4096):
+    ''' Extract patches at random locations from a list of images.
+
+    Candidate locations are drawn in batches and the patches are gathered
+    from strided views of the images. If random_seed is given, the locations
+    are drawn from a private np.random.RandomState(random_seed) and the
+    global random state is left untouched. Note that the batched drawing
+    yields different patches for a given seed than versions of ipcv drawing
+    one location at a time.
+
+    If filter_fun is given, only patches for which it returns True are kept.
+    If batch_filter is True, filter_fun is called with a (n, patch_size,
+    patch_size, ...) array of candidate patches and must return a boolean
+    array of length n. Otherwise it is called for each patch.
+    '''
     patches = np.empty((n_patches, patch_size, patch_size)+(imgs[0].shape[2:]))
+    radius = patch_size//2
+    padding = radius+1
+    if random_seed is None:
+        rng = np.random
+    else:
+        rng = np.random.RandomState(random_seed)
+    if isinstance(imgs, np.ndarray):
+        # Images of equal size can be indexed through a single view.
+        view = _patch_view(imgs, patch_size, axis=1)
+        views = None
+    else:
+        views = [_patch_view(np.asarray(img), patch_size) for img in imgs]
+    heights = np.array([img.shape[0] for img in imgs])
+    widths = np.array([img.shape[1] for img in imgs])
+
     i = 0
-    padding = patch_size//2+1
-    if random_seed is not None:
-        np.random.seed(random_seed)
+    acceptance = 1.0
     while i < n_patches:
-        img_idx = np.random.randint(0, len(imgs))
-        img = imgs[img_idx]
-        y = np.random.randint(padding, img.shape[0]-padding)
-        x = np.random.randint(padding, img.shape[1]-padding)
-        patches[i, ...] = patch(img, (y, x), patch_size)
-        if filter_fun is not None:
-            if not filter_fun(patches[i, ...]):
-                continue
-        i += 1
+        n_candidates = int(np.ceil((n_patches-i) / acceptance))
+        n_candidates = max(1, min(n_candidates, batch_size))
+        img_idxs = rng.randint(0, len(imgs), size=n_candidates)
+        ys = rng.randint(padding, heights[img_idxs]-padding)
+        xs = rng.randint(padding, widths[img_idxs]-padding)
+        ys -= radius
+        xs -= radius
+
+        if filter_fun is not None and not batch_filter:
+            # Evaluate the filter on views to avoid copying rejected patches
+            if views is None:
+                candidates = (view[k, y, x] for k, y, x
+                              in zip(img_idxs, ys, xs))
+            else:
+                candidates = (views[k][y, x] for k, y, x
+                              in zip(img_idxs, ys, xs))
+            keep = np.array([bool(filter_fun(p)) for p in candidates],
+                            dtype=bool)
+            img_idxs, ys, xs = img_idxs[keep], ys[keep], xs[keep]
+
+        # Gather the patches
+        if views is None:
+            batch = view[img_idxs, ys, xs]
+        else:
+            batch = np.empty((len(img_idxs),) + patches.shape[1:])
+            for k in np.unique(img_idxs):
+                sel = img_idxs == k
+                batch[sel] = views[k][ys[sel], xs[sel]]
+
+        if filter_fun is not None and batch_filter:
+            batch = batch[np.asarray(filter_fun(batch), dtype=bool)]
+
+        n_accepted = min(len(batch), n_patches-i)
+        patches[i:i+n_accepted] = batch[:n_accepted]
+        i += n_accepted
+        acceptance = max(len(batch) / float(n_candidates), 0.01)
     return patches
@@ -0,0 +1,56 @@
+import hashlib
+import numpy as np
+
+from .disk_cache import DiskCache
+from .image import imread
+
+
+# Bump when the decoding below changes to invalidate cached images.
+_DECODE_VERSION = b'gray-float32-1'
+
+
+class ImageCache:
+    def __init__(self, cache_dir, max_bytes=None):
+        ''' Decode images once and keep them as .npy files in cache_dir.
+
+        Images are keyed by a hash of their file contents, so renamed or
+        copied files share a cache entry and modified files are decoded
+        again. The cache holds at most max_bytes; the least recently used
+        images are evicted first.
+        '''
+        self.cache = DiskCache(cache_dir, max_bytes)
+
+    def load(self, path):
+        ''' Return the image at path as a (h, w) float32 array with
+        intensities in [0, 1]. The array is read-only: cached images are
+        memory-mapped and freshly decoded images are locked likewise such
+        that callers behave the same on hits and misses. '''
+        with open(path, 'rb') as f:
+            key = hashlib.sha1(_DECODE_VERSION + f.read()).hexdigest()
+        img = self.cache.get(key)
+        if img is None:
+            img = np.array(imread(path, flatten=True), dtype=np.float32)
+            img /= 255
+            self.cache.put(key, img)
+            img.flags.writeable = False
+        return img
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class ImageDataset:
+    def __init__(self, paths, cache_dir, max_bytes=None):
+        ''' A sequence of grayscale images backed by an ImageCache. '''
+        self.paths = list(paths)
+        self.cache = ImageCache(cache_dir, max_bytes)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, idx):
+        return self.cache.load(self.paths[idx])
+
+    def __iter__(self):
+        for path in self.paths:
+            yield self.cache.load(path)
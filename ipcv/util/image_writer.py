@@ -0,0 +1,93 @@
+import os
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from .image import stretch_intensity, _imwrite
+
+
+class ImageWriter:
+    def __init__(self, n_threads=2, max_pending=16):
+        ''' Asynchronous drop-in replacement for imsave().
+
+        Images passed to save() are stretched, converted, encoded and written
+        by a pool of n_threads threads. At most max_pending images are queued;
+        further calls to save() block until an image has been written. Use it
+        as a context manager to wait for all images on exit:
+
+            with ImageWriter() as writer:
+                writer.save('out/img.png', img)
+        '''
+        self.executor = ThreadPoolExecutor(n_threads)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.dirpaths = set()
+        self.futures = []
+        self.errors = []
+
+    def _write(self, path, img, stretch):
+        if stretch:
+            img = (255*stretch_intensity(img)).astype(np.uint8)
+        dirpath = os.path.dirname(path)
+        if len(dirpath) > 0 and dirpath not in self.dirpaths:
+            try:
+                os.makedirs(dirpath)
+            except OSError:
+                if not os.path.isdir(dirpath):
+                    raise
+            with self.lock:
+                self.dirpaths.add(dirpath)
+        _imwrite(path, img)
+
+    def _done(self, future):
+        self.slots.release()
+
+    def _collect(self, futures):
+        ''' Move the errors of finished futures to self.errors and return the
+        unfinished futures. Must be called with self.lock held. '''
+        pending = []
+        for future in futures:
+            if not future.done():
+                pending.append(future)
+            elif future.exception() is not None:
+                self.errors.append(future.exception())
+        return pending
+
+    def save(self, path, img, stretch=True):
+        ''' Queue img to be written to path. img is copied such that the
+        caller may reuse its buffer immediately. '''
+        self.slots.acquire()
+        future = self.executor.submit(self._write, path, np.array(img),
+                                      stretch)
+        future.add_done_callback(self._done)
+        with self.lock:
+            self.futures = self._collect(self.futures)
+            self.futures.append(future)
+
+    def flush(self):
+        ''' Wait until all queued images have been written. Raises the first
+        error encountered by a writer thread. '''
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            future.exception()
+        with self.lock:
+            # The done callbacks may still be running, so the errors are
+            # taken from the futures themselves.
+            self.futures = self._collect(self.futures)
+            errors = self.errors
+            self.errors = []
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
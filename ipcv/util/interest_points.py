@@ -1,8 +1,6 @@
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
 
-from scipy.ndimage.interpolation import affine_transform
+from ..profiling import stage
 
 
 def read_keypoints(path):
@@ -28,6 +26,9 @@ def write_keypoints(path, keypoints, descs=None):
 
 
 def draw_keypoint(keypoint, scale):
+    # matplotlib is imported on first use to keep "import ipcv" light.
+    import matplotlib.patches
+    import matplotlib.pyplot as plt
     x = keypoint[0]
     y = keypoint[1]
     a = keypoint[2]
@@ -49,6 +50,7 @@ def draw_keypoint(keypoint, scale):
 
 
 def extract_keypoint(img, keypoint, patch_shape, scale):
+    from scipy.ndimage.interpolation import affine_transform
     x = keypoint[0]
     y = keypoint[1]
     a = keypoint[2]
@@ -62,6 +64,8 @@ def extract_keypoint(img, keypoint, patch_shape, scale):
 
     offset = np.array([y, x])
     offset -= np.dot(A, np.array([patch_shape[0], patch_shape[1]]))/2
-    patch = affine_transform(img, A, offset=offset, output_shape=patch_shape,
-                             order=1, prefilter=False)
+    with stage('extract_keypoint'):
+        patch = affine_transform(img, A, offset=offset,
+                                 output_shape=patch_shape, order=1,
+                                 prefilter=False)
     return patch
@@ -0,0 +1,174 @@
+import functools
+import hashlib
+import inspect
+import threading
+import types
+import numpy as np
+
+from .disk_cache import DiskCache
+
+
+def _canonicalize(obj, h):
+    ''' Feed a canonical representation of obj to the hash h. '''
+    if isinstance(obj, np.ndarray):
+        h.update(b'ndarray')
+        h.update(repr((obj.dtype.str, obj.shape)).encode())
+        h.update(np.ascontiguousarray(obj).data)
+    elif isinstance(obj, (list, tuple)):
+        h.update(('%s%i' % (type(obj).__name__, len(obj))).encode())
+        for item in obj:
+            _canonicalize(item, h)
+    elif isinstance(obj, dict):
+        h.update(('dict%i' % len(obj)).encode())
+        for key in sorted(obj, key=repr):
+            _canonicalize(key, h)
+            _canonicalize(obj[key], h)
+    elif obj is None or isinstance(obj, (bool, int, float, complex, str,
+                                         bytes, np.generic)):
+        h.update(repr(obj).encode())
+    elif isinstance(obj, types.FunctionType):
+        # Functions (including lambdas and closures) are keyed by their code
+        # and the values they capture, not by their (empty) attributes.
+        h.update(('function%s.%s' % (obj.__module__,
+                                     obj.__qualname__)).encode())
+        _canonicalize(obj.__code__, h)
+        _canonicalize(obj.__defaults__, h)
+        _canonicalize(obj.__kwdefaults__, h)
+        cells = obj.__closure__ or ()
+        _canonicalize([_global_key(c.cell_contents) for c in cells], h)
+        names = sorted(n for n in _code_names(obj.__code__)
+                       if n in obj.__globals__)
+        _canonicalize([(n, _global_key(obj.__globals__[n])) for n in names],
+                      h)
+    elif isinstance(obj, types.CodeType):
+        h.update(b'code')
+        h.update(obj.co_code)
+        _canonicalize(obj.co_consts, h)
+        _canonicalize(obj.co_names, h)
+    elif isinstance(obj, types.MethodType):
+        h.update(b'method')
+        _canonicalize(obj.__func__, h)
+        _canonicalize(obj.__self__, h)
+    elif isinstance(obj, type):
+        h.update(('class%s.%s' % (obj.__module__,
+                                  obj.__qualname__)).encode())
+    elif isinstance(obj, (types.BuiltinFunctionType, np.ufunc)):
+        h.update(('builtin%s.%s' % (getattr(obj, '__module__', None),
+                                    obj.__name__)).encode())
+    elif hasattr(obj, '__dict__'):
+        # Objects such as JetDescriptor are keyed by their attributes.
+        h.update(type(obj).__name__.encode())
+        _canonicalize(vars(obj), h)
+    else:
+        raise TypeError('Cannot hash %s.' % type(obj).__name__)
+
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _code_names(const)
+    return names
+
+
+def _global_key(obj):
+    ''' Modules, functions and classes referenced by a function are keyed by
+    their names, other values by their contents. '''
+    if isinstance(obj, (types.ModuleType, types.FunctionType,
+                        types.BuiltinFunctionType, np.ufunc, type)):
+        return getattr(obj, '__module__', None), getattr(obj, '__name__')
+    return obj
+
+
+def _name(fun):
+    if hasattr(fun, '__self__'):
+        return '%s.%s' % (type(fun.__self__).__name__, fun.__name__)
+    return '%s.%s' % (fun.__module__, fun.__name__)
+
+
+class ResultCache:
+    def __init__(self, cache_dir, max_bytes=None, mmap_mode=None):
+        ''' Content-addressed on-disk cache of function results.
+
+        Results are keyed by a hash of the function name and its arguments.
+        Arrays are hashed by their bytes, objects such as a bound
+        JetDescriptor by their attributes and functions by their code and
+        the values they reference. Results must be arrays or tuples
+        of arrays and are stored as .npy files in a DiskCache, which makes the
+        cache safe to share between processes and bounds its size to
+        max_bytes. E.g.
+
+            cache = ResultCache('/tmp/ipcv-cache')
+            go_hist = cache.memoize(ipcv.go_hist)
+            compute = cache.memoize(JetDescriptor().compute)
+        '''
+        self.cache = DiskCache(cache_dir, max_bytes)
+        self.mmap_mode = mmap_mode
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, fun, args, kwargs):
+        h = hashlib.sha1()
+        _canonicalize(_name(fun), h)
+        if hasattr(fun, '__self__'):
+            _canonicalize(fun.__self__, h)
+        try:
+            # Bind the arguments such that positional and keyword arguments
+            # and explicitly passed defaults give the same key.
+            bound = inspect.signature(fun).bind(*args, **kwargs)
+            bound.apply_defaults()
+            _canonicalize(dict(bound.arguments), h)
+        except (TypeError, ValueError):
+            _canonicalize(list(args), h)
+            _canonicalize(kwargs, h)
+        return h.hexdigest()
+
+    def _get(self, key):
+        meta = self.cache.get(key, mmap_mode=None)
+        if meta is None:
+            return None
+        n_items, is_tuple = meta
+        items = []
+        for i in range(n_items):
+            item = self.cache.get('%s-%i' % (key, i), self.mmap_mode)
+            if item is None:
+                # Partially evicted
+                return None
+            items.append(item)
+        return tuple(items) if is_tuple else items[0]
+
+    def _put(self, key, result):
+        is_tuple = isinstance(result, tuple)
+        items = result if is_tuple else (result,)
+        for i, item in enumerate(items):
+            self.cache.put('%s-%i' % (key, i), np.asarray(item))
+        self.cache.put(key, np.array([len(items), is_tuple], dtype=np.int64))
+
+    def call(self, fun, *args, **kwargs):
+        ''' Return fun(*args, **kwargs), computing it only on a cache
+        miss. '''
+        key = self.key(fun, args, kwargs)
+        result = self._get(key)
+        with self.lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if result is None:
+            result = fun(*args, **kwargs)
+            self._put(key, result)
+        return result
+
+    def memoize(self, fun):
+        ''' Return a cached version of fun. '''
+        @functools.wraps(fun)
+        def wrapper(*args, **kwargs):
+            return self.call(fun, *args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        ''' Return hit/miss counts and the cache size in bytes. '''
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'bytes': self.cache.stats()['bytes']}
@@ -17,6 +17,9 @@ setup(
     url = 'http://compute.dtu.dk/~abll',
     packages = find_packages(),
     install_requires = ['numpy', 'scipy', 'matplotlib'],
+    entry_points = {
+        'console_scripts': ['ipcv = ipcv.cli:main'],
+    },
     long_description = read('README.md'),
     classifiers = [
         'Development Status :: 4 - Beta',